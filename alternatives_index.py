@@ -0,0 +1,93 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from pre_processing.normalization import normalized_columns
+
+# "Similar but healthier" products: nearest neighbours over the normalized nutrient vector,
+# within the same macro category, keeping only products with a higher health score.
+# One KD-tree per category, built once at startup. In each category the rows are sorted by
+# health score, so the products healthier than a given score are a suffix of the category:
+#   - if the suffix is small, it is searched exhaustively (a few thousand distances);
+#   - otherwise the tree is asked for more and more neighbours until k of them are in the suffix.
+# Products without a health score are left out.
+
+# Below this many healthier candidates, the exhaustive search is cheaper than the tree
+brute_force_limit = 4096
+
+
+class CategoryTree:
+    def __init__(self, positions, scores, points, names, leafsize):
+        order = np.argsort(scores, kind='stable')
+        # Row positions in df, their health scores (ascending), nutrient vectors and names
+        self.positions = positions[order]
+        self.scores = scores[order]
+        self.points = np.ascontiguousarray(points[order])
+        self.names = names[order]
+        self.tree = cKDTree(self.points, leafsize=leafsize)
+
+    def __len__(self):
+        return len(self.positions)
+
+    # Indices (in this category) of the k nearest products with index >= start, one per name
+    def nearest(self, point, start, k, exclude_name):
+        candidates = len(self) - start
+        if candidates <= 0:
+            return []
+        if candidates <= brute_force_limit:
+            distances = np.sqrt(((self.points[start:] - point) ** 2).sum(axis=1))
+            order = np.argsort(distances, kind='stable')
+            return self.pick(start + order, distances[order], k, exclude_name)
+
+        # Expected number of neighbours to ask for, given the share of healthier products
+        count = min(len(self), int((k + 1) * len(self) / candidates * 2) + 1)
+        while True:
+            distances, indices = self.tree.query(point, k=count)
+            distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+            eligible = indices >= start
+            found = self.pick(indices[eligible], distances[eligible], k, exclude_name)
+            if len(found) >= k or count >= len(self):
+                return found
+            count = min(len(self), count * 4)
+
+    def pick(self, indices, distances, k, exclude_name):
+        found = []
+        seen = {exclude_name}
+        for index, distance in zip(indices, distances):
+            name = self.names[index]
+            if name in seen:
+                continue
+            seen.add(name)
+            found.append((int(self.positions[index]), float(self.scores[index]), float(distance)))
+            if len(found) == k:
+                break
+        return found
+
+
+class AlternativesIndex:
+    def __init__(self, df, columns=normalized_columns, leafsize=32):
+        self.columns = list(columns)
+        self.points = df[self.columns].to_numpy(dtype=np.float64)
+        self.scores = df['health_score'].to_numpy(dtype=np.float64)
+        self.categories = df['macro_category'].astype(str).to_numpy()
+        names = df['product_name_es'].astype(str).to_numpy()
+
+        self.trees = {}
+        for category, positions in df.groupby('macro_category', observed=True).indices.items():
+            positions = positions[~np.isnan(self.scores[positions])]
+            if len(positions):
+                self.trees[str(category)] = CategoryTree(positions, self.scores[positions], self.points[positions],
+                                                         names[positions], leafsize)
+        self.names = names
+
+    # [(position, health_score, distance)] of up to k products of the same category, closest first.
+    # With healthier=True only products with a higher health score are returned (any scored product
+    # if the product itself has no score). Products named like the given one are skipped.
+    def alternatives(self, position, k=5, healthier=True):
+        tree = self.trees.get(self.categories[position])
+        if tree is None:
+            return []
+        score = self.scores[position]
+        start = 0
+        if healthier and not np.isnan(score):
+            start = int(np.searchsorted(tree.scores, score, side='right'))
+        return tree.nearest(self.points[position], start, k, self.names[position])
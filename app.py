@@ -1,25 +1,104 @@
 import dash
 from dash import dcc, html, Input, Output, State
-import dash_table
+from dash import dash_table
+import math
+import functools
+import os
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 import openai
-from sklearn.preprocessing import MinMaxScaler
+from product_store import open_store
+from pre_processing.normalization import normalized_columns, add_normalized_columns
+from pre_processing.dataset_io import compact_frame
+from pre_processing.search_index import SearchIndex, search_fields, search_index_path
+from product_index import ProductIndex, ProductLookup, product_options
+from alternatives_index import AlternativesIndex
+from table_query import apply_filter, apply_sort, query_columns
+from scatter_plot import build_scatter_figure, default_max_points
+from llm_cache import ResponseCache, CachedChatClient, default_cache_path
+from stub_client import StubChatClient
+from recommendations import RecommendationEngine, category_minima
+from category_extractor import CategoryExtractor
+from callback_metrics import CallbackMetrics
 
-# Load the cleaned data
-df = pd.read_csv('final_preprocessed_breakfast_products_with_health_score.csv')
+# Open the cleaned data as a memory-mapped store shared by all the app workers
+# (falls back to loading the Parquet/CSV dataset if the .arrow store is missing)
+store = open_store('final_preprocessed_breakfast_products_with_health_score.parquet')
 
-# Min-Max Normalization
-scaler = MinMaxScaler()
-df[['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']] = scaler.fit_transform(
-    df[['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']])
+# Columns used by the callbacks to filter and plot. The long text columns (categories,
+# ingredients, ...) stay in the store and are only read for the rows that are displayed
+frame_columns = ['code', 'product_name_es', 'brands', 'macro_category', 'energy-kcal_value', 'sugars_value', 'fat_value',
+                 'saturated-fat_value', 'proteins_value', 'salt_value', 'fiber_value', 'health_score']
+# The normalized nutrients are precomputed by the pipeline (pre_processing/normalization.py);
+# datasets built before that get them computed here
+if set(normalized_columns) <= set(store.columns):
+    df = store.frame(frame_columns + normalized_columns)
+else:
+    df = add_normalized_columns(store.frame(frame_columns))
+# Compact working copy (categoricals, float32) for the plots and indexes; the values shown in
+# the table and details, and the table filters, use the exact values of the store. The float
+# columns of a memory-mapped store are kept as float64: they are views of the mapped file, shared
+# by the workers, where a float32 copy would be private to each of them
+df = compact_frame(df, downcast_floats=not store.mapped)
+# Columns shown in the table and sent to the LLM: the raw values, without the normalized copies
+display_columns = [col for col in store.columns if col not in normalized_columns]
 
-# Initialize the OpenAI API
-client = openai.OpenAI(api_key='Your API Key Here')
+# Options of the category/brand/product dropdowns, built once
+product_index = ProductIndex(df)
+# Constant-time product lookups by code or name
+product_lookup = ProductLookup(df)
+# Nearest neighbours over the normalized nutrients, per category ("similar but healthier")
+alternatives_index = AlternativesIndex(df)
+
+# Full-text search over names, brands, categories and ingredients, built by the pipeline;
+# rebuilt here if it is missing or older than the dataset
+search_path = search_index_path(store.path or 'final_preprocessed_breakfast_products_with_health_score.parquet')
+product_search = None
+if os.path.exists(search_path) and store.path and os.path.getmtime(search_path) >= os.path.getmtime(store.path):
+    product_search = SearchIndex.load(search_path)
+if product_search is None or len(product_search) != len(store):
+    product_search = SearchIndex.from_frame(store.frame([col for col in search_fields if col in store.columns]))
+# Number of options sent to a product dropdown
+max_product_options = 50
+
+# Selected columns for the given rows of df, with the exact values of the store
+def product_columns(index, columns):
+    return store.rows(index, [col for col in columns if col in store.columns])
+
+# Full records (with the text columns read from the store) for the given rows of df
+def product_rows(index):
+    return product_columns(index, display_columns)
+
+# Initialize the OpenAI API (LLM_STUB=1 uses a local stub instead, e.g. for development)
+client = StubChatClient() if os.environ.get('LLM_STUB') else openai.OpenAI(api_key='Your API Key Here')
+
+# Responses are cached per model, prompt and dataset version (see llm_cache.py)
+llm_cache = ResponseCache(os.environ.get('LLM_CACHE_PATH', default_cache_path))
+llm = CachedChatClient(client, llm_cache, dataset_version=store.version)
+
+# Local keyword/synonym index of the macro categories, asked before the LLM
+category_extractor = CategoryExtractor.from_frame(store.frame(['macro_category', 'product_name_es', 'categories']))
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
+# WSGI entry point for multi-worker deployments, e.g. `gunicorn app:server -w 4`
+server = app.server
+
+# Hit/miss counters of the LLM response cache (per worker)
+@server.route('/metrics/llm-cache')
+def llm_cache_metrics():
+    return llm_cache.stats()
+
+# Latency, LLM time and payload size of every callback, served at /metrics/callbacks (see
+# callback_metrics.py; CALLBACK_METRICS_LOG logs every call, PROFILE_SLOW_MS=500 profiles slow calls)
+metrics = CallbackMetrics.from_environ()
+metrics.init_app(server)
+metrics.register_cache('llm', llm_cache.stats)
+
+# Per-category recommendations, sent to the LLM concurrently (see recommendations.py); only the
+# LLM calls are counted as LLM time
+recommender = RecommendationEngine(llm, category_minima(df), lambda position: product_rows([position]).iloc[0].to_dict(),
+                                   llm_timer=metrics.llm_time)
 
 app.layout = html.Div([
     html.H1("Health-Conscious Breakfast Product Dashboard", style={'text-align': 'center'}),
@@ -31,7 +110,7 @@ app.layout = html.Div([
                 html.Div([
                     dcc.Dropdown(
                         id='macro-category-dropdown',
-                        options=[{'label': cat, 'value': cat} for cat in df['macro_category'].unique()],
+                        options=product_index.category_options,
                         placeholder='Select a macro category',
                         style={'margin-bottom': '10px'}
                     ),
@@ -52,9 +131,18 @@ app.layout = html.Div([
                         placeholder='Select number of rows to display',
                         style={'margin-bottom': '10px'}
                     ),
+                    # Paging, sorting and filtering run in update_table: only the visible page is sent
                     dash_table.DataTable(
                         id='product-table',
+                        columns=[{'name': col, 'id': col} for col in display_columns],
+                        page_current=0,
                         page_size=10,
+                        page_action='custom',
+                        sort_action='custom',
+                        sort_mode='multi',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query='',
                         style_table={'overflowX': 'auto'},
                         style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
                         style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'}
@@ -81,12 +169,14 @@ app.layout = html.Div([
                 html.P("Select a macro category and a product to view detailed nutritional information.", style={'text-align': 'center'}),
                 dcc.Dropdown(
                     id='macro-category-dropdown-single',
-                    options=[{'label': category, 'value': category} for category in df['macro_category'].unique()],
+                    options=product_index.category_options,
                     placeholder='Select a macro category',
                     style={'margin': '10px auto', 'width': '80%'}
                 ),
-                dcc.Dropdown(id='product-dropdown-single', placeholder='Select a product', style={'margin': '10px auto', 'width': '80%'}),
-                dcc.Graph(id='single-product-graph')
+                dcc.Dropdown(id='product-dropdown-single', placeholder='Select or search a product (name, brand, ingredients)',
+                             search_order='original', style={'margin': '10px auto', 'width': '80%'}),
+                dcc.Graph(id='single-product-graph'),
+                html.Div(id='single-product-alternatives', style={'margin': '10px auto', 'width': '80%'})
             ])
         ]),
         dcc.Tab(label='Compare Two Products', children=[
@@ -95,17 +185,20 @@ app.layout = html.Div([
                 html.P("Select two products to compare their nutritional values.", style={'text-align': 'center'}),
                 dcc.Dropdown(
                     id='macro-category-dropdown-compare',
-                    options=[{'label': category, 'value': category} for category in df['macro_category'].unique()],
+                    options=product_index.category_options,
                     placeholder='Select a macro category',
                     style={'margin': '10px auto', 'width': '80%'}
                 ),
                 dcc.Dropdown(id='brand-dropdown-compare-1', placeholder='Select first brand', style={'margin': '10px auto', 'width': '80%'}),
                 dcc.Dropdown(id='brand-dropdown-compare-2', placeholder='Select second brand', style={'margin': '10px auto', 'width': '80%'}),
-                dcc.Dropdown(id='compare-product-1', placeholder='Select first product', style={'margin': '10px auto', 'width': '80%'}),
-                dcc.Dropdown(id='compare-product-2', placeholder='Select second product', style={'margin': '10px auto', 'width': '80%'}),
+                dcc.Dropdown(id='compare-product-1', placeholder='Select or search the first product', search_order='original',
+                             style={'margin': '10px auto', 'width': '80%'}),
+                dcc.Dropdown(id='compare-product-2', placeholder='Select or search the second product', search_order='original',
+                             style={'margin': '10px auto', 'width': '80%'}),
                 html.Button('Compare', id='compare-button', style={'display': 'block', 'margin': '10px auto'}),
                 html.Div(id='comparison-results', style={'margin-top': '20px'}),
-                html.Div(id='comparison-graph')
+                html.Div(id='comparison-graph'),
+                html.Div(id='comparison-alternatives', style={'margin-top': '20px'})
             ])
         ])
     ])
@@ -116,42 +209,63 @@ app.layout = html.Div([
     Output('brand-dropdown', 'options'),
     [Input('macro-category-dropdown', 'value')]
 )
+@metrics.instrument
 def update_brand_options(selected_macro_category):
     if selected_macro_category:
-        filtered_df = df[df['macro_category'] == selected_macro_category]
-        brands = filtered_df['brands'].unique()
-        return [{'label': brand, 'value': brand} for brand in brands]
+        return product_index.brand_options(selected_macro_category)
     return []
 
-# Callback to update product table based on selected category and brand
+# Callback to update product table based on selected category and brand.
+# The table filter and sort are applied first, then the number of rows selected in row-dropdown,
+# and only the current page is serialized
 @app.callback(
-    Output('product-table', 'data'),
-    [Input('macro-category-dropdown', 'value'), Input('brand-dropdown', 'value'), Input('row-dropdown', 'value')]
+    [Output('product-table', 'data'), Output('product-table', 'page_count')],
+    [Input('macro-category-dropdown', 'value'), Input('brand-dropdown', 'value'), Input('row-dropdown', 'value'),
+     Input('product-table', 'page_current'), Input('product-table', 'page_size'),
+     Input('product-table', 'sort_by'), Input('product-table', 'filter_query')]
 )
-def update_table(selected_macro_category, selected_brand, num_rows):
-    filtered_df = df.copy()
-    if selected_macro_category:
-        filtered_df = filtered_df[filtered_df['macro_category'] == selected_macro_category]
-    if selected_brand:
-        filtered_df = filtered_df[filtered_df['brands'] == selected_brand]
-    if num_rows != 'All':
-        filtered_df = filtered_df.head(num_rows)
-    return filtered_df.to_dict('records')
+@metrics.instrument
+def update_table(selected_macro_category, selected_brand, num_rows, page_current, page_size, sort_by, filter_query):
+    positions = product_index.row_positions(selected_macro_category, selected_brand)
+    columns = query_columns(filter_query, sort_by)
+    if columns:
+        queried_df = apply_sort(apply_filter(product_columns(positions, columns), filter_query), sort_by)
+        positions = queried_df.index.to_numpy()
+    if num_rows and num_rows != 'All':
+        positions = positions[:num_rows]
+
+    page_current = page_current or 0
+    page_count = max(1, math.ceil(len(positions) / page_size))
+    page = positions[page_current * page_size:(page_current + 1) * page_size]
+    return product_rows(page).to_dict('records'), page_count
+
+# Go back to the first page when the selection changes
+@app.callback(
+    Output('product-table', 'page_current'),
+    [Input('macro-category-dropdown', 'value'), Input('brand-dropdown', 'value'), Input('row-dropdown', 'value'),
+     Input('product-table', 'sort_by'), Input('product-table', 'filter_query')]
+)
+@metrics.instrument
+def reset_table_page(selected_macro_category, selected_brand, num_rows, sort_by, filter_query):
+    return 0
+
+# Scatter figures only depend on the dataset, so each category is built once
+@functools.lru_cache(maxsize=None)
+def scatter_figure(selected_macro_category):
+    filtered_df = df.iloc[product_index.row_positions(selected_macro_category)]
+    return build_scatter_figure(filtered_df, x='normalized_sugars_value', y='normalized_fat_value',
+                                max_points=default_max_points)
+
+metrics.register_cache('scatter', lambda: scatter_figure.cache_info()._asdict())
 
 # Callback to update nutritional scatter plot based on selected category
 @app.callback(
     Output('nutritional-scatter', 'figure'),
     [Input('macro-category-dropdown', 'value')]
 )
+@metrics.instrument
 def update_scatter(selected_macro_category):
-    if selected_macro_category:
-        filtered_df = df[df['macro_category'] == selected_macro_category]
-    else:
-        filtered_df = df
-    fig = px.scatter(filtered_df, x='sugars_value', y='fat_value', color='macro_category',
-                     title='Sugar vs Fat Content (Normalized)',
-                     hover_data={'product_name_es': True, 'sugars_value': True, 'fat_value': True, 'macro_category': True})
-    return fig
+    return scatter_figure(selected_macro_category or None)
 
 # Combined callback for query processing and plot click events
 @app.callback(
@@ -159,6 +273,7 @@ def update_scatter(selected_macro_category):
     [Input('query-button', 'n_clicks'), Input('nutritional-scatter', 'clickData')],
     [State('user-query', 'value')]
 )
+@metrics.instrument
 def handle_query_and_click(n_clicks, clickData, user_query):
     ctx = dash.callback_context
 
@@ -171,62 +286,30 @@ def handle_query_and_click(n_clicks, clickData, user_query):
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
     if trigger_id == 'query-button' and n_clicks and user_query:
-        prompt = f"You need to extract the following information from a short text and I will provide to you: macro_category. For the macro_category you can choose only from this values without altering them (do not change the way they are written cause I am going to use them to make a query hence I need exactly those names): milk, muffins, croissants, honey, jam, peanut_butter, fresh_fruit, fruit_juice, hot_drink, yogurt, cereals, cereal_bars. Example: User Input: 'I want cereal with milk for breakfast' Example of Output: ['cereals', 'milk']. As you can see the output must be a list in which you can put all the categories that you detect inside the user input. User Input: '{user_query}'"
-        
-        response_extraction = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that extracts information from text."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        categories = eval(response_extraction.choices[0].message.content.strip())
-        
-        recommendations = ""
-        for category in categories:
-            category_df = df[(df['macro_category'] == category) & (df['sugars_value'] > 0) & (df['fat_value'] > 0) & (df['energy-kcal_value'] > 0)]
-            if category_df.empty:
-                continue
-                
-            lowest_sugar = category_df.nsmallest(1, 'sugars_value').to_dict('records')[0]
-            lowest_fat = category_df.nsmallest(1, 'fat_value').to_dict('records')[0]
-            lowest_calories = category_df.nsmallest(1, 'energy-kcal_value').to_dict('records')[0]
-            
-            options = [lowest_sugar, lowest_fat, lowest_calories]
-            prompt = (
-                f"We need you to decide for the category '{category}' which one is the healthiest product since our user wants this '{user_query}'. "
-                f"Those are the products you have to choose from:\n"
-                f"Product 1:\n{lowest_sugar}\n\n"
-                f"Product 2:\n{lowest_fat}\n\n"
-                f"Product 3:\n{lowest_calories}\n\n"
-                f"Please be synthetic and provide the name of the product for each category that you think is the healthiest and a couple of motivations for why."
-            )
-            
-            response_decision = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that provides nutritional recommendations."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            response_text = response_decision.choices[0].message.content.strip()
-            # Format the title and motivations
-            title = f"### Healthiest Options - {category.capitalize()}"
-            lines = response_text.split("**Motivations:**")
-            description = lines[0].replace("###", "").strip()
-            motivations = lines[1].strip() if len(lines) > 1 else ""
+        categories, confident = category_extractor.extract(user_query)
+        if not confident:
+            category_list = ', '.join(category_extractor.categories)
+            prompt = f"You need to extract the following information from a short text and I will provide to you: macro_category. For the macro_category you can choose only from this values without altering them (do not change the way they are written cause I am going to use them to make a query hence I need exactly those names): {category_list}. Example: User Input: 'I want cereal with milk for breakfast' Example of Output: ['cereals', 'milk']. As you can see the output must be a list in which you can put all the categories that you detect inside the user input. User Input: '{user_query}'"
+
+            with metrics.llm_time():
+                response_extraction = llm.complete(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant that extracts information from text."},
+                        {"role": "user", "content": prompt}
+                    ]
+                )
 
-            # Combine parts
-            recommendations += f"{title}\n\n{description}\n\n**Motivations:**\n{motivations}\n\n"
+            categories = category_extractor.parse_llm_categories(response_extraction)
+
+        recommendations = recommender.recommend(categories, user_query)
 
         query_results = dcc.Markdown(recommendations)
 
     elif trigger_id == 'nutritional-scatter' and clickData:
         point = clickData['points'][0]
-        product_name = point['customdata'][0]
-        clicked_product = df[df['product_name_es'] == product_name].iloc[0]
+        product_code, product_name, product_category = point['customdata'][:3]
+        clicked_product = product_rows([product_lookup.resolve(product_code, product_name, product_category)]).iloc[0]
         clicked_product_info = html.Div([
             html.H3(f"Product Name: {clicked_product['product_name_es']}"),
             html.P(f"Sugar Value: {clicked_product['sugars_value']}"),
@@ -239,26 +322,51 @@ def handle_query_and_click(n_clicks, clickData, user_query):
 
     return query_results, clicked_product_info
 
-# Callback to update product dropdown in single product section based on selected macro category
+# Options of a product dropdown: the best matches of the typed text in the selected category/brand,
+# or the first products of the selection when nothing is typed. Only max_product_options are sent,
+# and the selected product is always kept (the dropdown clears a value missing from its options)
+def search_product_options(search_value, category=None, brand=None, selected=None):
+    if search_value:
+        positions = product_search.search(search_value, k=max_product_options * 4,
+                                          positions=product_index.row_positions(category, brand) if category or brand else None)
+        options = product_options(df, positions, max_product_options)
+        # `search` makes the dropdown keep matches on brands/ingredients when it filters the options itself
+        options = [{**option, 'search': search_value} for option in options]
+    else:
+        options = product_index.product_options(category, brand, max_product_options)
+    if selected and selected not in [option['value'] for option in options]:
+        position = product_lookup.by_key(selected)
+        options = (product_options(df, [position]) if position is not None else [{'label': selected, 'value': selected}]) + options
+    return options
+
+# Callback to update product dropdown in single product section based on selected macro category and typed text
 @app.callback(
     Output('product-dropdown-single', 'options'),
-    [Input('macro-category-dropdown-single', 'value')]
+    [Input('product-dropdown-single', 'search_value'), Input('macro-category-dropdown-single', 'value')],
+    [State('product-dropdown-single', 'value')]
 )
-def update_product_options_single(selected_macro_category):
-    if selected_macro_category:
-        filtered_df = df[df['macro_category'] == selected_macro_category]
-        return [{'label': product, 'value': product} for product in filtered_df['product_name_es'].unique()]
-    return []
+@metrics.instrument
+def update_product_options_single(search_value, selected_macro_category, selected_product):
+    return search_product_options(search_value, selected_macro_category, selected=selected_product)
+
+# Store positions of the selected product keys, or None if one is not selected or no longer in the
+# store (a dropdown keeps its value across a dataset rebuild or a duplicate merge)
+def selected_positions(*keys):
+    positions = [product_lookup.by_key(key) if key else None for key in keys]
+    return None if None in positions else positions
 
-# Callback to update single product graph based on selected product
+# Callback to update single product graph based on selected product (the dropdowns hold product keys)
 @app.callback(
     Output('single-product-graph', 'figure'),
     [Input('product-dropdown-single', 'value')]
 )
+@metrics.instrument
 def update_single_product_graph(selected_product):
-    if selected_product:
-        product_details = df[df['product_name_es'] == selected_product].iloc[0]
-        product_data = product_details[['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']]
+    positions = selected_positions(selected_product)
+    if positions:
+        product_details = df.iloc[positions[0]]
+        product_data = product_details[normalized_columns]
+        product_data.index = [col.replace('normalized_', '') for col in normalized_columns]
         product_data = product_data[product_data > 0]
         
         fig = go.Figure(data=go.Scatterpolar(
@@ -266,49 +374,80 @@ def update_single_product_graph(selected_product):
             theta=product_data.index,
             fill='toself'
         ))
-        fig.update_layout(title=f'Nutritional Information for {selected_product}', hovermode='closest')
+        fig.update_layout(title=f"Nutritional Information for {product_details['product_name_es']}", hovermode='closest')
         return fig
     return {}
 
+# Products of the same category as the product at `position` with the closest nutritional values and
+# a higher health score
+def alternatives_table(position, k=5):
+    product_name = df.iloc[position]['product_name_es']
+    alternatives = alternatives_index.alternatives(position, k)
+    if not alternatives:
+        return html.P(f"No healthier alternative found for {product_name}.")
+    products = df.iloc[[alternative_position for alternative_position, _, _ in alternatives]]
+    data = [{'Product': product['product_name_es'], 'Brand': product['brands'], 'Health Score': round(score, 3),
+             'Distance': round(distance, 3)}
+            for (_, product), (_, score, distance) in zip(products.iterrows(), alternatives)]
+    score = df.iloc[position]['health_score']
+    title = f"Similar but healthier than {product_name} (health score {score:.3f})" if pd.notna(score) else \
+        f"Similar products with a health score ({product_name} has none)"
+    return html.Div([
+        html.H4(title),
+        dash_table.DataTable(
+            data=data,
+            columns=[{'name': col, 'id': col} for col in ['Product', 'Brand', 'Health Score', 'Distance']],
+            style_cell={'textAlign': 'left'},
+            style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+        )
+    ])
+
+# Callback to list healthier alternatives of the product selected in the single product section
+@app.callback(
+    Output('single-product-alternatives', 'children'),
+    [Input('product-dropdown-single', 'value')]
+)
+@metrics.instrument
+def update_single_product_alternatives(selected_product):
+    positions = selected_positions(selected_product)
+    if positions:
+        return alternatives_table(positions[0])
+    return html.Div()
+
 # Callback to update brand dropdown in comparison section based on selected macro category
 @app.callback(
     [Output('brand-dropdown-compare-1', 'options'),
      Output('brand-dropdown-compare-2', 'options')],
     [Input('macro-category-dropdown-compare', 'value')]
 )
+@metrics.instrument
 def update_brand_options_compare(selected_macro_category):
     if selected_macro_category:
-        filtered_df = df[df['macro_category'] == selected_macro_category]
-        brands = filtered_df['brands'].unique()
-        return ([{'label': brand, 'value': brand} for brand in brands], 
-                [{'label': brand, 'value': brand} for brand in brands])
+        brands = product_index.brand_options(selected_macro_category)
+        return (brands, brands)
     return ([], [])
 
-# Callback to update first product dropdown in comparison section based on selected macro category and brand
+# Callback to update first product dropdown in comparison section based on selected macro category, brand and typed text
 @app.callback(
     Output('compare-product-1', 'options'),
-    [Input('macro-category-dropdown-compare', 'value'), Input('brand-dropdown-compare-1', 'value')]
+    [Input('compare-product-1', 'search_value'), Input('macro-category-dropdown-compare', 'value'),
+     Input('brand-dropdown-compare-1', 'value')],
+    [State('compare-product-1', 'value')]
 )
-def update_product1_options_compare(selected_macro_category, selected_brand_1):
-    filtered_df = df.copy()
-    if selected_macro_category:
-        filtered_df = filtered_df[filtered_df['macro_category'] == selected_macro_category]
-    if selected_brand_1:
-        filtered_df = filtered_df[filtered_df['brands'] == selected_brand_1]
-    return [{'label': product, 'value': product} for product in filtered_df['product_name_es'].unique()]
+@metrics.instrument
+def update_product1_options_compare(search_value, selected_macro_category, selected_brand_1, product1):
+    return search_product_options(search_value, selected_macro_category, selected_brand_1, product1)
 
-# Callback to update second product dropdown in comparison section based on selected macro category and brand
+# Callback to update second product dropdown in comparison section based on selected macro category, brand and typed text
 @app.callback(
     Output('compare-product-2', 'options'),
-    [Input('macro-category-dropdown-compare', 'value'), Input('brand-dropdown-compare-2', 'value')]
+    [Input('compare-product-2', 'search_value'), Input('macro-category-dropdown-compare', 'value'),
+     Input('brand-dropdown-compare-2', 'value')],
+    [State('compare-product-2', 'value')]
 )
-def update_product2_options_compare(selected_macro_category, selected_brand_2):
-    filtered_df = df.copy()
-    if selected_macro_category:
-        filtered_df = filtered_df[filtered_df['macro_category'] == selected_macro_category]
-    if selected_brand_2:
-        filtered_df = filtered_df[filtered_df['brands'] == selected_brand_2]
-    return [{'label': product, 'value': product} for product in filtered_df['product_name_es'].unique()]
+@metrics.instrument
+def update_product2_options_compare(search_value, selected_macro_category, selected_brand_2, product2):
+    return search_product_options(search_value, selected_macro_category, selected_brand_2, product2)
 
 # Callback to update the product comparison based on selected products
 @app.callback(
@@ -316,10 +455,12 @@ def update_product2_options_compare(selected_macro_category, selected_brand_2):
     [Input('compare-button', 'n_clicks')],
     [State('compare-product-1', 'value'), State('compare-product-2', 'value')]
 )
+@metrics.instrument
 def compare_products(n_clicks, product1, product2):
-    if n_clicks and product1 and product2:
-        product1_details = df[df['product_name_es'] == product1].iloc[0].to_dict()
-        product2_details = df[df['product_name_es'] == product2].iloc[0].to_dict()
+    positions = selected_positions(product1, product2)
+    if n_clicks and positions:
+        product1_details = product_rows([positions[0]]).iloc[0].to_dict()
+        product2_details = product_rows([positions[1]]).iloc[0].to_dict()
         
         prompt = (
             f"We need you to decide which one is the healthiest product. "
@@ -330,16 +471,16 @@ def compare_products(n_clicks, product1, product2):
             f"Take into account that when an attribute is equal to zero it could be just for the strategy we used to impute missing values hence use also common sense (I mean if one of the product is a twix it is not possible it doesn't have any sugar/flat/salt)."
         )
         
-        response_comparison = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that provides nutritional recommendations."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with metrics.llm_time():
+            comparison_results = llm.complete(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that provides nutritional recommendations."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         
         # Formatting the comparison results
-        comparison_results = response_comparison.choices[0].message.content.strip()
         comparison_results = dcc.Markdown(comparison_results)
         return comparison_results
     return ""
@@ -349,10 +490,12 @@ def compare_products(n_clicks, product1, product2):
     [Input('compare-button', 'n_clicks')],
     [State('compare-product-1', 'value'), State('compare-product-2', 'value')]
 )
+@metrics.instrument
 def update_comparison_graph(n_clicks, product1, product2):
-    if n_clicks and product1 and product2:
-        product1_details = df[df['product_name_es'] == product1].iloc[0]
-        product2_details = df[df['product_name_es'] == product2].iloc[0]
+    positions = selected_positions(product1, product2)
+    if n_clicks and positions:
+        product1_details = product_rows([positions[0]]).iloc[0]
+        product2_details = product_rows([positions[1]]).iloc[0]
         
         nutritional_values = ['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']
         
@@ -419,6 +562,19 @@ def update_comparison_graph(n_clicks, product1, product2):
         return table
     return html.Div()
 
+# Callback to list healthier alternatives of both compared products
+@app.callback(
+    Output('comparison-alternatives', 'children'),
+    [Input('compare-button', 'n_clicks')],
+    [State('compare-product-1', 'value'), State('compare-product-2', 'value')]
+)
+@metrics.instrument
+def update_comparison_alternatives(n_clicks, product1, product2):
+    positions = selected_positions(product1, product2)
+    if n_clicks and positions:
+        return html.Div([alternatives_table(position) for position in positions])
+    return html.Div()
+
 # Run the Dash app
 if __name__ == '__main__':
-    app.run_server(debug=True, port=3000)
+    app.run(debug=True, port=3000)
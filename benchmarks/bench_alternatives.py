@@ -0,0 +1,65 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from alternatives_index import AlternativesIndex
+from pre_processing.normalization import normalized_columns
+
+
+# Synthetic frame with the columns used by the index: 17 categories, skewed nutrient values
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.beta(0.5, 4, size=(rows, len(normalized_columns))), columns=normalized_columns)
+    df['macro_category'] = pd.Categorical(rng.integers(0, 17, size=rows).astype(str))
+    df['product_name_es'] = [f'Producto {i}' for i in range(rows)]
+    df['health_score'] = rng.random(rows)
+    return df
+
+
+# What the app would do without the index: distances to every product of the category
+def scan(df, position, k):
+    category = df['macro_category'].iat[position]
+    candidates = df[(df['macro_category'] == category) & (df['health_score'] > df['health_score'].iat[position])]
+    distances = np.sqrt(((candidates[normalized_columns].to_numpy() - df[normalized_columns].iloc[position].to_numpy()) ** 2).sum(axis=1))
+    return candidates.index[np.argsort(distances)[:k]]
+
+
+def per_query_ms(func, positions):
+    times = []
+    for position in positions:
+        start = time.perf_counter()
+        func(position)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.median(times) * 1000, times[int(len(times) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of "similar but healthier" queries: KD-trees vs a full scan.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'build (s)':>11}{'index p50 (ms)':>16}{'index p95 (ms)':>16}{'scan p50 (ms)':>15}")
+    for rows in args.sizes:
+        df = synthetic_frame(rows)
+        start = time.perf_counter()
+        index = AlternativesIndex(df)
+        build_s = time.perf_counter() - start
+
+        positions = np.random.default_rng(1).integers(0, rows, size=args.queries)
+        index_p50, index_p95 = per_query_ms(lambda position: index.alternatives(position, args.k), positions)
+        scan_p50, _ = per_query_ms(lambda position: scan(df, position, args.k), positions[:20])
+        print(f'{rows:>10}{build_s:>11.2f}{index_p50:>16.2f}{index_p95:>16.2f}{scan_p50:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
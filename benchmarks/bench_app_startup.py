@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Each measurement runs in a fresh interpreter, so nothing is already imported or cached
+STARTUP = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+print(int('sklearn' in __import__('sys').modules))
+"""
+
+# What app.py did at import time before the normalization was precomputed by the pipeline
+LEGACY_SCALER = """
+import time
+import pandas as pd
+df = pd.read_parquet('final_preprocessed_breakfast_products_with_health_score.parquet')
+columns = ['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']
+start = time.perf_counter()
+from sklearn.preprocessing import MinMaxScaler
+df[columns] = MinMaxScaler().fit_transform(df[columns])
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, env):
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout.split()
+    return [float(value) for value in output]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import/startup time of app.py, in fresh interpreters.')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Stub LLM client and a throwaway response cache: only the startup is measured
+        env = dict(os.environ, LLM_STUB='1', LLM_CACHE_PATH=os.path.join(tmp, 'llm_cache.sqlite3'))
+        runs = [run(STARTUP, env) for _ in range(args.runs)]
+        print(f"import app: median {statistics.median(r[0] for r in runs) * 1000:.0f} ms, "
+              f"min {min(r[0] for r in runs) * 1000:.0f} ms over {args.runs} runs "
+              f"(sklearn imported: {'yes' if runs[0][1] else 'no'})")
+        try:
+            legacy = [run(LEGACY_SCALER, env)[0] for _ in range(args.runs)]
+            print(f"sklearn import + MinMaxScaler fit (previously at startup): median {statistics.median(legacy) * 1000:.0f} ms")
+        except subprocess.CalledProcessError:
+            print('sklearn is not installed: skipping the MinMaxScaler comparison')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'pre_processing'))
+
+import dataset_io
+
+
+def time_load(path, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dataset_io.read_dataset(path)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load time and size of the dataset in each storage format.')
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'final_preprocessed_breakfast_products_with_health_score.parquet'),
+                        help='Dataset to convert (any supported format, falls back to the CSV export)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = args.dataset if os.path.exists(args.dataset) else dataset_io.find_dataset(args.dataset)
+    df = dataset_io.read_dataset(path)
+    print(f'Dataset: {path} ({len(df)} rows)')
+
+    tmp_dir = tempfile.mkdtemp()
+    print(f"{'format':<10}{'load (ms)':>12}{'size (MB)':>12}")
+    for fmt in dataset_io.supported_formats:
+        target = os.path.join(tmp_dir, f'dataset.{fmt}')
+        dataset_io.write_dataset(df, target)
+        seconds = time_load(target, args.repeat)
+        size_mb = os.path.getsize(target) / 1024 ** 2
+        print(f'{fmt:<10}{seconds * 1000:>12.1f}{size_mb:>12.2f}')
+        os.remove(target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pre_processing import dataset_io
+
+
+# The frame as the app used to hold it: Python object strings and float64
+def legacy_frame(df):
+    return df.astype({col: object for col in df.columns if df[col].dtype.kind not in 'if'})
+
+
+# Time to compute the mask of an equality filter
+def filter_ms(df, column, value, repeat=7):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df[column] == value
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and equality-filter time: object/float64 frame vs compact frame.')
+    parser.add_argument('--dataset', default='final_preprocessed_breakfast_products_with_health_score.parquet',
+                        help='Preprocessed dataset; its rows are replicated up to each size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[14_428, 1_000_000])
+    args = parser.parse_args()
+
+    base = dataset_io.read_dataset(dataset_io.find_dataset(args.dataset))
+    filters = [('macro_category', 'milk'), ('brands', 'Hacendado'), ('ingredients_text_es', 'Unknown'),
+               ('product_name_es', base['product_name_es'].iloc[0])]
+    for rows in args.sizes:
+        df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+        before = legacy_frame(df)
+        after = dataset_io.compact_frame(df)
+        print(f'\n{rows} rows: {dataset_io.frame_memory_mb(before):.1f} MB -> {dataset_io.frame_memory_mb(after):.1f} MB '
+              f'({dataset_io.frame_memory_mb(before) / dataset_io.frame_memory_mb(after):.1f}x smaller)')
+
+        memory_before = before.memory_usage(deep=True, index=False) / 1e6
+        memory_after = after.memory_usage(deep=True, index=False) / 1e6
+        print(f"{'column':<30}{'before (MB)':>12}{'after (MB)':>12}  dtype")
+        for col in df.columns:
+            print(f'{col:<30}{memory_before[col]:>12.2f}{memory_after[col]:>12.2f}  {after[col].dtype.name}')
+
+        print(f"{'equality filter':<30}{'before (ms)':>12}{'after (ms)':>12}")
+        for column, value in filters:
+            print(f'{column:<30}{filter_ms(before, column, value):>12.2f}{filter_ms(after, column, value):>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
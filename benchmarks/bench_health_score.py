@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import dataset_io
+import health_score
+
+
+# The original column-by-column formula of combined_df_explorer.py (temporary adj_/normalized_ columns)
+def legacy_health_score(df):
+    df = df.copy()
+    df['adj_sugars_value'] = df['sugars_value'].replace(0, np.nan)
+    df['adj_fat_value'] = df['fat_value'].replace(0, np.nan)
+    df['adj_saturated_fat_value'] = df['saturated-fat_value'].replace(0, np.nan)
+    df['adj_proteins_value'] = df['proteins_value'].replace(0, np.nan)
+    df['adj_salt_value'] = df['salt_value'].replace(0, np.nan)
+    df['adj_fiber_value'] = df['fiber_value'].replace(0, np.nan)
+
+    df['normalized_calories'] = df['energy-kcal_value'] / df['energy-kcal_value'].max()
+    df['normalized_sugars'] = df['adj_sugars_value'] / df['adj_sugars_value'].max()
+    df['normalized_fat'] = df['adj_fat_value'] / df['adj_fat_value'].max()
+    df['normalized_saturated_fat'] = df['adj_saturated_fat_value'] / df['adj_saturated_fat_value'].max()
+    df['normalized_proteins'] = df['adj_proteins_value'] / df['adj_proteins_value'].max()
+    df['normalized_salt'] = df['adj_salt_value'] / df['adj_salt_value'].max()
+    df['normalized_fiber'] = df['adj_fiber_value'] / df['adj_fiber_value'].max()
+
+    df['health_score'] = (df['normalized_proteins'] + df['normalized_fiber']) / (df['normalized_sugars'] + df['normalized_fat'] + df['normalized_saturated_fat'] + df['normalized_salt'] + 1)
+
+    df.drop(['normalized_calories', 'normalized_sugars', 'normalized_fat', 'normalized_saturated_fat',
+             'normalized_proteins', 'normalized_salt', 'normalized_fiber',
+             'adj_sugars_value', 'adj_fat_value', 'adj_saturated_fat_value',
+             'adj_proteins_value', 'adj_salt_value', 'adj_fiber_value'], axis=1, inplace=True)
+    return df
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Health score: column-by-column formula vs one NumPy pass.')
+    parser.add_argument('--dataset', default='final_preprocessed_breakfast_products_with_health_score.parquet',
+                        help='Preprocessed dataset; its rows are replicated up to each size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    base = dataset_io.read_dataset(dataset_io.find_dataset(args.dataset), columns=health_score.score_columns)
+
+    print(f"{'rows':>10}{'legacy (s)':>12}{'vectorized (s)':>16}{'speedup':>9}{'rescore (s)':>13}")
+    for rows in args.sizes:
+        df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+        legacy_s, legacy = best_of(lambda: legacy_health_score(df), args.repeat)
+        vectorized_s, scores = best_of(lambda: health_score.health_scores(df), args.repeat)
+        assert np.allclose(legacy['health_score'].to_numpy(), scores, equal_nan=True)
+
+        # Scoring a batch against stored maxima gives the same scores as a full recompute
+        maxima = health_score.compute_maxima(df)
+        batch = df.iloc[: rows // 10]
+        rescore_s, batch_scores = best_of(lambda: health_score.health_scores(batch, maxima), args.repeat)
+        assert np.allclose(batch_scores, scores[: rows // 10], equal_nan=True)
+        print(f'{rows:>10}{legacy_s:>12.3f}{vectorized_s:>16.3f}{legacy_s / vectorized_s:>8.1f}x{rescore_s:>13.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import pandas as pd
+import dataset_io
+import df_combiner
+
+
+# The ingestion path before column pruning: parse every column, then select
+def legacy_ingest(csv_files, output_path):
+    dfs = []
+    for file in csv_files:
+        df = pd.read_csv(file, delimiter='\t', on_bad_lines='skip', low_memory=False)
+        df = df[[col for col in df_combiner.relevant_columns if col in df.columns]]
+        df['macro_category'] = df_combiner.category_from_file(file)
+        dfs.append(df)
+    pd.concat(dfs, ignore_index=True).to_csv(output_path, index=False)
+
+
+# Resident memory (MB) of a process and all its descendants (e.g. the workers of a process pool),
+# summed from /proc (Linux). Pages shared after fork are counted in every process
+def tree_rss_mb(root):
+    parents, rss = {}, {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{entry}/statm') as f:
+                rss[int(entry)] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, IndexError, ValueError):
+            # The process exited while it was being read
+            continue
+    tree, pending = set(), [root]
+    while pending:
+        pid = pending.pop()
+        tree.add(pid)
+        pending += [child for child, parent in parents.items() if parent == pid and child not in tree]
+    return sum(rss.get(pid, 0) for pid in tree) / 1024 ** 2
+
+
+# Peak of tree_rss_mb for this process while the block runs, sampled every `interval` seconds
+class PeakTreeRSS:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.done = threading.Event()
+
+    def sample(self):
+        while not self.done.is_set():
+            self.peak_mb = max(self.peak_mb, tree_rss_mb(os.getpid()))
+            self.done.wait(self.interval)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        return False
+
+
+def run_mode(mode, csv_files, chunksize, workers):
+    output_path = os.path.join(tempfile.mkdtemp(), 'combined.csv')
+    with PeakTreeRSS() as tree_rss:
+        start = time.perf_counter()
+        ingest(mode, csv_files, output_path, chunksize, workers)
+        elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux. The parallel mode parses the files in pool
+    # workers: RUSAGE_CHILDREN gives the largest worker, and the sampled total adds them all up
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    worker_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    os.remove(output_path)
+    return {'mode': mode, 'seconds': round(elapsed, 3), 'peak_rss_mb': round(peak_rss_mb, 1),
+            'worker_peak_rss_mb': round(worker_rss_mb, 1), 'total_peak_rss_mb': round(max(tree_rss.peak_mb, peak_rss_mb), 1)}
+
+
+def ingest(mode, csv_files, output_path, chunksize, workers):
+    if mode == 'legacy':
+        legacy_ingest(csv_files, output_path)
+    elif mode == 'in_memory':
+        df_combiner.combine_csv_files(csv_files)[0].to_csv(output_path, index=False)
+    elif mode == 'parallel':
+        df_combiner.combine_csv_files(csv_files, workers=workers)[0].to_csv(output_path, index=False)
+    elif mode == 'streaming':
+        df_combiner.stream_csv_files(csv_files, output_path, chunksize=chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare wall time and peak RSS of the ingestion modes.')
+    parser.add_argument('--input-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dfs_products'))
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    csv_files = dataset_io.category_files(args.input_dir)
+
+    # Each mode runs in its own process so peak RSS is not shared between them
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, csv_files, args.chunksize, args.workers)))
+        return
+
+    results = []
+    for mode in ['legacy', 'in_memory', 'parallel', 'streaming']:
+        out = subprocess.run([sys.executable, __file__, '--mode', mode, '--input-dir', args.input_dir,
+                              '--chunksize', str(args.chunksize), '--workers', str(args.workers)],
+                             capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<12}{'seconds':>10}{'peak RSS (MB)':>16}{'largest worker':>16}{'with workers':>14}")
+    for result in results:
+        print(f"{result['mode']:<12}{result['seconds']:>10}{result['peak_rss_mb']:>16}"
+              f"{result['worker_peak_rss_mb']:>16}{result['total_peak_rss_mb']:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from product_index import ProductLookup
+
+
+# Synthetic frame with the columns used by the lookups; about one name in ten is a duplicate
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    names = rng.integers(0, int(rows * 0.9), size=rows)
+    return pd.DataFrame({
+        'code': [f'{8400000000000 + i}' for i in range(rows)],
+        'product_name_es': [f'Producto {n}' for n in names],
+        'sugars_value': rng.random(rows),
+    })
+
+
+def per_call_us(func, args_list):
+    times = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-click latency of product lookups: full scan vs hash index.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--clicks', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'build (ms)':>12}{'scan (us)':>14}{'by name (us)':>14}{'by code (us)':>14}")
+    for rows in args.sizes:
+        df = synthetic_frame(rows)
+        start = time.perf_counter()
+        lookup = ProductLookup(df)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        sample = df.sample(args.clicks, random_state=1)
+        names = [(name,) for name in sample['product_name_es']]
+        codes = [(code,) for code in sample['code']]
+        scan = per_call_us(lambda name: df[df['product_name_es'] == name].iloc[0], names)
+        by_name = per_call_us(lambda name: df.iloc[lookup.by_name(name)], names)
+        by_code = per_call_us(lambda code: df.iloc[lookup.by_code(code)], codes)
+        print(f'{rows:>10}{build_ms:>12.1f}{scan:>14.1f}{by_name:>14.1f}{by_code:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pre_processing import dataset_io
+from pre_processing.search_index import SearchIndex, search_fields, fold
+
+
+# Typeahead queries taken from the product names: the first word cut after 3 letters, the first
+# word, and the first word plus the start of the second
+def sample_queries(df, count, seed=1):
+    names = df['product_name_es'].dropna().astype(str).sample(count, random_state=seed)
+    queries = []
+    for name in names:
+        words = name.split()
+        queries.append(words[0][:3])
+        queries.append(words[0])
+        if len(words) > 1:
+            queries.append(f'{words[0]} {words[1][:3]}')
+    return [query for query in queries if query.strip()]
+
+
+# What a search costs without an index: folding and matching every name
+def scan(names, query):
+    folded = fold(query)
+    return names[names.str.contains(folded, regex=False)].index[:50]
+
+
+def per_query_ms(func, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.median(times) * 1000, times[int(len(times) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search: build time and typeahead latency of the inverted index.')
+    parser.add_argument('--dataset', default='final_preprocessed_breakfast_products_with_health_score.parquet',
+                        help='Preprocessed dataset; its rows are replicated up to each size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    base = dataset_io.read_dataset(dataset_io.find_dataset(args.dataset), columns=list(search_fields))
+    print(f"{'rows':>10}{'build (s)':>11}{'index (MB)':>12}{'index p50 (ms)':>16}{'index p95 (ms)':>16}{'scan p50 (ms)':>15}")
+    for rows in args.sizes:
+        df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+        start = time.perf_counter()
+        index = SearchIndex.from_frame(df)
+        build_s = time.perf_counter() - start
+        size_mb = sum(array.nbytes for array in [index.terms, index.offsets, index.rows, index.weights]) / 1e6
+
+        queries = sample_queries(df, args.queries)
+        index_p50, index_p95 = per_query_ms(index.search, queries)
+        names = df['product_name_es'].astype(str).map(fold)
+        scan_p50, _ = per_query_ms(lambda query: scan(names, query), queries[:20])
+        print(f'{rows:>10}{build_s:>11.1f}{size_mb:>12.1f}{index_p50:>16.2f}{index_p95:>16.2f}{scan_p50:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from pre_processing import dataset_io
+from product_store import ProductStore
+
+DATASET = os.path.join(ROOT, 'final_preprocessed_breakfast_products_with_health_score.parquet')
+
+
+# Memory owned by this process only (Linux): pages written by the process itself, which
+# cannot be shared with the other workers
+def private_dirty_mb():
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+# One simulated app worker: load the dataset, touch every column, then wait for the others.
+# The 'app' mode imports the whole app (store, working frame, indexes), with the stub LLM client,
+# from the directory of the dataset
+def worker(mode, dataset, barrier, results):
+    if mode == 'app':
+        os.chdir(os.path.dirname(os.path.abspath(dataset)))
+        os.environ['LLM_STUB'] = '1'
+        os.environ.setdefault('LLM_CACHE_PATH', os.path.join(ROOT, 'llm_cache.sqlite3'))
+        # The libraries are imported first: only the memory of the app's own data is measured
+        import dash.dash_table, openai, plotly.express, plotly.graph_objects, pyarrow, scipy.spatial  # noqa: F401
+    before = private_dirty_mb()
+    start = time.perf_counter()
+    if mode == 'app':
+        import app  # noqa: F401
+    elif mode == 'mmap':
+        table = ProductStore.open(dataset_io.with_format(dataset, 'arrow')).table
+        for column in table.columns:
+            column.nbytes
+    else:
+        df = dataset_io.read_dataset(dataset)
+        df.memory_usage(deep=True)
+    elapsed = time.perf_counter() - start
+    results.put((elapsed, private_dirty_mb() - before))
+    barrier.wait()
+
+
+def run(mode, workers, dataset=DATASET):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(mode, dataset, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    open_ms = max(elapsed for elapsed, _ in measurements) * 1000
+    memory_mb = sum(memory for _, memory in measurements)
+    return open_ms, memory_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time and private memory of N workers loading the dataset '
+                                                 '(parquet, mmap) or importing the app (app).')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--dataset', default=DATASET,
+                        help='Preprocessed dataset, with its .arrow store (the app mode needs the default file name)')
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'workers':>8}{'slowest open (ms)':>20}{'private memory, all workers (MB)':>35}")
+    for mode in ['parquet', 'mmap', 'app']:
+        open_ms, memory_mb = run(mode, args.workers, args.dataset)
+        print(f'{mode:<10}{args.workers:>8}{open_ms:>20.1f}{memory_mb:>35.1f}')
+
+
+if __name__ == '__main__':
+    main()
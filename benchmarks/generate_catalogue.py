@@ -0,0 +1,136 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'pre_processing'))
+
+import dataset_io
+import df_combiner
+
+# Synthetic Open Food Facts catalogue for the benchmarks: one tab-separated export per macro
+# category, with the header of the real export of the category (dfs_products/) and rows derived
+# from its rows, so any number of rows can be generated with realistic texts, gaps and values.
+# Every generated row copies a random real row of its category, with:
+#   - a new, unique code;
+#   - a variant word appended to part of the product names ("Jamón cocido extra");
+#   - a number appended to the (first) brand ("Hacendado 3"), so that a real product is sold under
+#     several brands instead of being repeated: there are about as many brand numbers as
+#     generated rows per real row, and rows sharing a real row, variant word and brand number
+#     are duplicates for the dedup stage of the pipeline (like a product listed twice in the real exports);
+#   - the nutrient values multiplied by a random factor (missing values stay missing).
+# Rows are split between the categories in the proportions of the real exports. A share of
+# malformed lines (too many fields, skipped by the reader) can be added.
+# The same seed and number of rows always give the same files.
+
+variant_words = ['clasico', 'original', 'light', 'bio', 'extra', 'familiar', 'mini', 'natural', 'integral',
+                 'tradicional', 'premium', 'eco', 'casero', 'suave', 'intenso', 'receta', 'selección', 'gourmet']
+# Share of the product names that get a variant word
+variant_share = 0.5
+# Spread of the random factor applied to the nutrient values (log-normal sigma)
+nutrient_spread = 0.2
+# Synthetic codes start here (the 2xxxxxxxxxxxx range is reserved for in-store codes)
+first_code = 2_000_000_000_000
+
+default_source_dir = os.path.join(ROOT, 'dfs_products')
+
+
+# Field as written in the raw export: no tabs or line breaks, quoted if it starts with a quote
+def encode_field(value):
+    value = value.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+    if value.startswith('"'):
+        value = '"' + value.replace('"', '""') + '"'
+    return value
+
+
+class CategoryTemplate:
+    def __init__(self, path):
+        rows = pd.read_csv(path, delimiter='\t', on_bad_lines='skip', dtype=str, keep_default_na=False)
+        self.category = df_combiner.category_from_file(path)
+        self.header = list(rows.columns)
+        self.columns = [np.array([encode_field(value) for value in rows[col]], dtype=object) for col in self.header]
+        self.names = rows['product_name_es'].to_numpy(dtype=object) if 'product_name_es' in rows else None
+        self.brands = rows['brands'].to_numpy(dtype=object) if 'brands' in rows else None
+        self.nutrients = {col: pd.to_numeric(rows[col], errors='coerce').to_numpy()
+                          for col in df_combiner.nutrient_columns if col in rows}
+        self.n_rows = len(rows)
+
+    # Lines of `count` generated rows, with codes starting at `code` and brand numbers below `brand_numbers`
+    def lines(self, rng, count, code, bad_line_rate=0.0, brand_numbers=1):
+        picks = rng.integers(self.n_rows, size=count)
+        columns = {col: values[picks] for col, values in zip(self.header, self.columns)}
+        if 'code' in columns:
+            columns['code'] = np.arange(code, code + count).astype(str).astype(object)
+        if self.names is not None:
+            names = self.names[picks]
+            variants = rng.integers(len(variant_words), size=count)
+            with_variant = (rng.random(count) < variant_share) & (names != '')
+            names[with_variant] = names[with_variant] + ' ' + np.array(variant_words, dtype=object)[variants[with_variant]]
+            columns['product_name_es'] = np.array([encode_field(name) for name in names], dtype=object)
+        if self.brands is not None:
+            numbers = rng.integers(brand_numbers, size=count)
+            columns['brands'] = np.array([encode_field(brand.replace(',', f' {number},', 1) if ',' in brand else f'{brand} {number}')
+                                          if brand else brand for brand, number in zip(self.brands[picks], numbers)],
+                                         dtype=object)
+        for col, values in self.nutrients.items():
+            values = np.round(values[picks] * rng.lognormal(0.0, nutrient_spread, size=count), 2)
+            columns[col] = np.where(np.isnan(values), '', values.astype(str)).astype(object)
+
+        lines = ['\t'.join(fields) for fields in zip(*(columns[col].tolist() for col in self.header))]
+        for index in np.flatnonzero(rng.random(count) < bad_line_rate):
+            lines[index] += '\tmalformed\tline'
+        return lines
+
+
+# Number of rows of each category, proportional to the real exports (largest remainders)
+def split_rows(templates, rows):
+    sizes = np.array([template.n_rows for template in templates], dtype=np.float64)
+    shares = rows * sizes / sizes.sum()
+    counts = np.floor(shares).astype(np.int64)
+    counts[np.argsort(counts - shares, kind='stable')[:rows - counts.sum()]] += 1
+    return counts
+
+
+# Writes <category>.csv files with `rows` rows in total to output_dir; returns {category: rows}
+def generate_catalogue(output_dir, rows, seed=0, bad_line_rate=0.0, source_dir=default_source_dir, chunksize=20_000):
+    templates = [CategoryTemplate(path) for path in dataset_io.category_files(source_dir)]
+    if not templates:
+        raise FileNotFoundError(f"No category exports in {source_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+    code = first_code
+    written = {}
+    for index, (template, count) in enumerate(zip(templates, split_rows(templates, rows))):
+        # One random stream per category, so a category does not depend on the size of the others
+        rng = np.random.default_rng([seed, index])
+        with open(os.path.join(output_dir, f'{template.category}.csv'), 'w', encoding='utf-8') as f:
+            f.write('\t'.join(template.header) + '\n')
+            for start in range(0, count, chunksize):
+                size = min(chunksize, count - start)
+                f.write('\n'.join(template.lines(rng, size, code, bad_line_rate, max(1, count // template.n_rows))) + '\n')
+                code += size
+        written[template.category] = int(count)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic catalogue of per-category exports for the benchmarks.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Total number of rows, split between the categories')
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bad-line-rate', type=float, default=0.0, help='Share of malformed lines')
+    parser.add_argument('--source-dir', default=default_source_dir, help='Real exports used as templates')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = generate_catalogue(args.output_dir, args.rows, args.seed, args.bad_line_rate, args.source_dir)
+    size_mb = sum(os.path.getsize(os.path.join(args.output_dir, f'{category}.csv')) for category in written) / 2**20
+    print(f"{sum(written.values())} rows in {len(written)} categories ({size_mb:.0f} MB) "
+          f"written to {args.output_dir} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+import numpy as np
+
+from generate_catalogue import generate_catalogue
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# End-to-end benchmark suite, on a synthetic catalogue (generate_catalogue.py) of any size:
+#   1. ingestion: pre_processing/df_combiner.py on the per-category exports;
+#   2. scoring: pre_processing/combined_df_explorer.py (cleaning, health score, normalization,
+#      search index, store);
+#   3. app startup: `import app` in fresh interpreters;
+#   4. callbacks: every Dash callback, called through the Flask test client (request parsing,
+#      callback, serialization) with the stub LLM client.
+# Each stage runs in its own process, in a work directory, and reports its wall time and peak RSS.
+# Results are written as JSON; --baseline compares them with the results of an earlier version.
+
+package_names = ['pandas', 'numpy', 'pyarrow', 'scipy', 'dash', 'plotly', 'flask']
+# Latency ratio (new / baseline) above which a metric is reported as a regression
+default_tolerance = 1.2
+
+# Run in the work directory by `--callbacks`: time `import app`
+STARTUP = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+
+# Runs a command and returns its wall time and peak RSS (from the rusage of that child only)
+def run_timed(command, cwd, env, log_path):
+    with open(log_path, 'a') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}, see {log_path}")
+    # ru_maxrss is reported in kilobytes on Linux
+    return {'seconds': round(elapsed, 3), 'peak_rss_mb': round(usage.ru_maxrss / 1024, 1)}
+
+
+# Body of a Dash callback request, as sent by the browser
+def dash_request(outputs, inputs, state=(), changed=None):
+    def spec(item):
+        return {'id': item[0], 'property': item[1]}
+
+    def value(item):
+        return {'id': item[0], 'property': item[1], 'value': item[2]}
+
+    if len(outputs) == 1:
+        output, outputs_spec = f'{outputs[0][0]}.{outputs[0][1]}', spec(outputs[0])
+    else:
+        output = '..' + '...'.join(f'{id_}.{prop}' for id_, prop in outputs) + '..'
+        outputs_spec = [spec(item) for item in outputs]
+    changed = changed or [f'{inputs[0][0]}.{inputs[0][1]}']
+    return {'output': output, 'outputs': outputs_spec, 'inputs': [value(item) for item in inputs],
+            'state': [value(item) for item in state], 'changedPropIds': changed}
+
+
+# (name, callback, request body for run i) of every callback, with inputs taken from the dataset:
+# the largest category, its most common brand and two of its products
+def callback_scenarios(app):
+    category = str(app.df['macro_category'].value_counts().index[0])
+    in_category = app.df[app.df['macro_category'] == category]
+    brand = str(in_category['brands'].value_counts().index[0])
+    scored = in_category[in_category['health_score'].notna()]
+    # The product dropdowns hold product keys ("<code>|<macro_category>")
+    code1, code2 = (str(code) for code in scored['code'].iloc[[0, len(scored) // 2]])
+    product1, product2 = f'{code1}|{category}', f'{code2}|{category}'
+    name = str(scored['product_name_es'].iloc[0])
+    typed = name.split()[0][:4]
+    table = [('macro-category-dropdown', 'value', category), ('brand-dropdown', 'value', None),
+             ('row-dropdown', 'value', 'All'), ('product-table', 'page_current', 0),
+             ('product-table', 'page_size', 10), ('product-table', 'sort_by', []), ('product-table', 'filter_query', '')]
+    table_outputs = [('product-table', 'data'), ('product-table', 'page_count')]
+    query_outputs = [('query-results', 'children'), ('clicked-product-info', 'children')]
+    compare_state = [('compare-product-1', 'value', product1), ('compare-product-2', 'value', product2)]
+
+    return [
+        ('update_brand_options', 'update_brand_options', lambda i: dash_request(
+            [('brand-dropdown', 'options')], [('macro-category-dropdown', 'value', category)])),
+        ('update_table', 'update_table', lambda i: dash_request(table_outputs, table)),
+        ('update_table_sorted_filtered', 'update_table', lambda i: dash_request(
+            table_outputs, table[:5] + [('product-table', 'sort_by', [{'column_id': 'health_score', 'direction': 'desc'}]),
+                                        ('product-table', 'filter_query', '{sugars_value} < 10')],
+            changed=['product-table.sort_by'])),
+        ('reset_table_page', 'reset_table_page', lambda i: dash_request(
+            [('product-table', 'page_current')], table[:3] + table[5:])),
+        # The figures are cached per category: the first run builds it, the others hit the cache
+        ('update_scatter', 'update_scatter', lambda i: dash_request(
+            [('nutritional-scatter', 'figure')], [('macro-category-dropdown', 'value', category)])),
+        ('scatter_click', 'handle_query_and_click', lambda i: dash_request(
+            query_outputs, [('query-button', 'n_clicks', None),
+                            ('nutritional-scatter', 'clickData', {'points': [{'customdata': [code1, name, category]}]})],
+            [('user-query', 'value', None)], changed=['nutritional-scatter.clickData'])),
+        # A different query every run, so none is answered by the LLM response cache
+        ('query', 'handle_query_and_click', lambda i: dash_request(
+            query_outputs, [('query-button', 'n_clicks', i + 1), ('nutritional-scatter', 'clickData', None)],
+            [('user-query', 'value', f'I want something for breakfast {i}')])),
+        ('update_product_options_single', 'update_product_options_single', lambda i: dash_request(
+            [('product-dropdown-single', 'options')],
+            [('product-dropdown-single', 'search_value', typed), ('macro-category-dropdown-single', 'value', category)],
+            [('product-dropdown-single', 'value', None)])),
+        ('update_single_product_graph', 'update_single_product_graph', lambda i: dash_request(
+            [('single-product-graph', 'figure')], [('product-dropdown-single', 'value', product1)])),
+        ('update_single_product_alternatives', 'update_single_product_alternatives', lambda i: dash_request(
+            [('single-product-alternatives', 'children')], [('product-dropdown-single', 'value', product1)])),
+        ('update_brand_options_compare', 'update_brand_options_compare', lambda i: dash_request(
+            [('brand-dropdown-compare-1', 'options'), ('brand-dropdown-compare-2', 'options')],
+            [('macro-category-dropdown-compare', 'value', category)])),
+        ('update_product1_options_compare', 'update_product1_options_compare', lambda i: dash_request(
+            [('compare-product-1', 'options')],
+            [('compare-product-1', 'search_value', typed), ('macro-category-dropdown-compare', 'value', category),
+             ('brand-dropdown-compare-1', 'value', brand)], [('compare-product-1', 'value', None)])),
+        ('update_product2_options_compare', 'update_product2_options_compare', lambda i: dash_request(
+            [('compare-product-2', 'options')],
+            [('compare-product-2', 'search_value', ''), ('macro-category-dropdown-compare', 'value', category),
+             ('brand-dropdown-compare-2', 'value', None)], [('compare-product-2', 'value', None)])),
+        # Same products every run: the first comparison calls the stub client, the others hit the cache
+        ('compare_products', 'compare_products', lambda i: dash_request(
+            [('comparison-results', 'children')], [('compare-button', 'n_clicks', i + 1)], compare_state)),
+        ('update_comparison_graph', 'update_comparison_graph', lambda i: dash_request(
+            [('comparison-graph', 'children')], [('compare-button', 'n_clicks', i + 1)], compare_state)),
+        ('update_comparison_alternatives', 'update_comparison_alternatives', lambda i: dash_request(
+            [('comparison-alternatives', 'children')], [('compare-button', 'n_clicks', i + 1)], compare_state)),
+    ]
+
+
+# Run by `--callbacks` in the work directory: times every scenario and prints the results as JSON
+def run_callbacks(runs):
+    sys.path.insert(0, ROOT)
+    import app
+
+    client = app.server.test_client()
+    results = {}
+    for name, callback, request in callback_scenarios(app):
+        latencies, sizes, statuses = [], [], set()
+        for i in range(runs):
+            start = time.perf_counter()
+            response = client.post('/_dash-update-component', json=request(i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(response.get_data()))
+            statuses.add(response.status_code)
+        rest = latencies[1:] or latencies
+        results[name] = {
+            'callback': callback,
+            'runs': runs,
+            'status': sorted(statuses),
+            'first_ms': round(latencies[0], 3),
+            'p50_ms': round(float(np.percentile(rest, 50)), 3),
+            'p95_ms': round(float(np.percentile(rest, 95)), 3),
+            'max_ms': round(max(rest), 3),
+            'payload_bytes': int(statistics.median(sizes)),
+        }
+    print(json.dumps(results))
+
+
+def git_info():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {'commit': git('rev-parse', 'HEAD') or None, 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def environment_info():
+    packages = {}
+    for name in package_names:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'packages': packages}
+
+
+def run_suite(args, work_dir):
+    catalogue_dir = args.catalogue_dir or os.path.join(work_dir, 'catalogue')
+    log_path = os.path.join(work_dir, 'suite.log')
+    # Stub LLM client, fresh response cache, no callback log
+    env = dict(os.environ, LLM_STUB='1', LLM_CACHE_PATH=os.path.join(work_dir, 'llm_cache.sqlite3'),
+               CALLBACK_METRICS_LOG='', PYTHONPATH=ROOT)
+    stages = {}
+
+    if not args.catalogue_dir:
+        start = time.perf_counter()
+        written = generate_catalogue(catalogue_dir, args.rows, seed=args.seed, bad_line_rate=args.bad_line_rate)
+        stages['generate'] = {'seconds': round(time.perf_counter() - start, 3), 'rows': sum(written.values())}
+    stages['generate'] = dict(stages.get('generate', {}), bytes=sum(
+        os.path.getsize(os.path.join(catalogue_dir, name)) for name in os.listdir(catalogue_dir) if name.endswith('.csv')))
+    print(f"catalogue: {catalogue_dir} ({stages['generate']['bytes'] / 2**20:.0f} MB)")
+
+    stages['ingestion'] = run_timed([sys.executable, os.path.join(ROOT, 'pre_processing', 'df_combiner.py'),
+                                     '--input-dir', catalogue_dir], work_dir, env, log_path)
+    print(f"ingestion: {stages['ingestion']}")
+    stages['scoring'] = run_timed([sys.executable, os.path.join(ROOT, 'pre_processing', 'combined_df_explorer.py')],
+                                  work_dir, env, log_path)
+    print(f"scoring: {stages['scoring']}")
+
+    startups = []
+    for _ in range(args.startup_runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP.format(root=ROOT)], cwd=work_dir, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        startups.append(float(output[-1]))
+    stages['app_startup'] = {'seconds': round(statistics.median(startups), 3), 'runs': [round(s, 3) for s in startups]}
+
+    output_path = os.path.join(work_dir, 'callbacks.json')
+    with open(output_path, 'w') as output:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--callbacks', '--runs', str(args.runs)],
+                                   cwd=work_dir, env=env, stdout=output, stderr=open(log_path, 'a'))
+        _, status, usage = os.wait4(process.pid, 0)
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError(f"The callback benchmark failed, see {log_path}")
+    stages['app_startup']['peak_rss_mb'] = round(usage.ru_maxrss / 1024, 1)
+    stages['callbacks'] = {'seconds': round(time.perf_counter() - start, 3)}
+    print(f"app startup: {stages['app_startup']}")
+    with open(output_path) as f:
+        callbacks = json.loads(f.read().strip().splitlines()[-1])
+
+    return {
+        'suite_version': 1,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git': git_info(),
+        'environment': environment_info(),
+        'parameters': {'rows': args.rows if not args.catalogue_dir else None, 'seed': args.seed,
+                       'bad_line_rate': args.bad_line_rate, 'runs': args.runs, 'catalogue_dir': args.catalogue_dir},
+        'stages': stages,
+        'callbacks': callbacks,
+    }
+
+
+# Compared metrics: wall time of the stages and median latency of the callbacks
+def suite_metrics(results):
+    metrics = {f'stage.{name}.seconds': stage['seconds'] for name, stage in results['stages'].items()
+               if name != 'generate'}
+    metrics.update({f'callback.{name}.p50_ms': callback['p50_ms'] for name, callback in results['callbacks'].items()})
+    return metrics
+
+
+# Prints new vs baseline for every metric; returns the metrics slower than tolerance * baseline
+def compare_results(results, baseline, tolerance=default_tolerance):
+    new, old = suite_metrics(results), suite_metrics(baseline)
+    regressions = []
+    print(f"{'metric':<52}{'baseline':>12}{'new':>12}{'ratio':>8}")
+    for name in sorted(new.keys() & old.keys()):
+        ratio = new[name] / old[name] if old[name] else float('inf')
+        flag = ''
+        if ratio > tolerance:
+            regressions.append(name)
+            flag = '  <- slower'
+        print(f"{name:<52}{old[name]:>12.3f}{new[name]:>12.3f}{ratio:>8.2f}{flag}")
+    if results['parameters'].get('rows') != baseline['parameters'].get('rows'):
+        print('Warning: the baseline was run on a different number of rows')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite on a synthetic catalogue, with JSON results.')
+    parser.add_argument('--rows', type=int, default=200_000, help='Rows of the synthetic catalogue')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bad-line-rate', type=float, default=0.001, help='Share of malformed lines in the catalogue')
+    parser.add_argument('--catalogue-dir', help='Use an existing catalogue instead of generating one')
+    parser.add_argument('--runs', type=int, default=20, help='Requests per callback scenario')
+    parser.add_argument('--startup-runs', type=int, default=3, help='Fresh interpreters importing app.py')
+    parser.add_argument('--work-dir', help='Directory of the intermediate files (default: a temporary one, removed)')
+    parser.add_argument('--output', help='JSON results (default: benchmarks/results/suite-<commit>-<rows>.json)')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance,
+                        help='Slowdown ratio reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on a regression')
+    parser.add_argument('--callbacks', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.callbacks:
+        run_callbacks(args.runs)
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_suite_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_suite(args, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"suite-{(results['git']['commit'] or 'unknown')[:10]}-{args.rows}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'callback scenario':<40}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>10}")
+    for name, callback in results['callbacks'].items():
+        print(f"{name:<40}{callback['first_ms']:>10.1f}{callback['p50_ms']:>10.1f}{callback['p95_ms']:>10.1f}"
+              f"{callback['payload_bytes']:>10}")
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) slower than {args.tolerance}x the baseline")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
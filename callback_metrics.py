@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+
+import flask
+
+# Instrumentation of the Dash callbacks (per worker process).
+# Every decorated callback records its latency (histogram + recent values for percentiles),
+# the time spent waiting for the LLM (the rest is app time: pandas, indexes, figures), the
+# size of the response sent to the browser and its outcome. Totals are served as JSON by the
+# app (/metrics/callbacks) and every call is appended to a JSON-lines log.
+# With a profiling threshold set, callbacks run under a profiler and the traces of the calls
+# slower than the threshold are dumped to a directory (pyinstrument HTML if it is installed,
+# cProfile .prof files otherwise, to open with snakeviz or pstats).
+
+# Upper bounds (ms) of the latency histogram buckets; slower calls go to the last, open bucket
+latency_buckets_ms = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+# Recent latencies kept per callback for the percentiles
+recent_size = 1000
+
+logger = logging.getLogger('callback_metrics')
+
+# LLM wait of the callback running in the current thread/context
+current_call = contextvars.ContextVar('current_call', default=None)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class CallbackStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prevented = 0
+        self.histogram = [0] * (len(latency_buckets_ms) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.llm_ms = 0.0
+        self.recent = deque(maxlen=recent_size)
+        self.responses = 0
+        self.payload_bytes = 0
+        self.max_payload_bytes = 0
+
+    def add_call(self, elapsed_ms, llm_ms, status):
+        self.calls += 1
+        self.errors += status == 'error'
+        self.prevented += status == 'prevented'
+        self.histogram[bisect.bisect_left(latency_buckets_ms, elapsed_ms)] += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.llm_ms += llm_ms
+        self.recent.append(elapsed_ms)
+
+    def add_payload(self, size):
+        self.responses += 1
+        self.payload_bytes += size
+        self.max_payload_bytes = max(self.max_payload_bytes, size)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        bounds = [f'le_{bound}' for bound in latency_buckets_ms] + ['le_inf']
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'prevented': self.prevented,
+            'latency_ms': {
+                'mean': self.total_ms / self.calls if self.calls else None,
+                'p50': percentile(recent, 0.5),
+                'p95': percentile(recent, 0.95),
+                'p99': percentile(recent, 0.99),
+                'max': self.max_ms,
+                'histogram': dict(zip(bounds, self.histogram)),
+            },
+            'llm_ms_total': self.llm_ms,
+            'app_ms_total': self.total_ms - self.llm_ms,
+            'payload_bytes': {
+                'mean': self.payload_bytes / self.responses if self.responses else None,
+                'max': self.max_payload_bytes,
+                'total': self.payload_bytes,
+            },
+        }
+
+
+class CallbackMetrics:
+    # log_path: JSON-lines log of every call (None to disable, '{pid}' is replaced by the worker's
+    # pid), rotated at log_max_bytes with log_backups old files; profile_slow_ms: profile the
+    # callbacks and dump the traces of the calls slower than this (None to disable)
+    def __init__(self, log_path=None, profile_slow_ms=None, profile_dir='profiles',
+                 log_max_bytes=10 * 1024 * 1024, log_backups=3):
+        self.stats = {}
+        self.caches = {}
+        self.lock = threading.Lock()
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        if log_path:
+            handler = logging.handlers.RotatingFileHandler(log_path.format(pid=os.getpid()),
+                                                           maxBytes=log_max_bytes,
+                                                           backupCount=log_backups)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    # Settings from the environment: CALLBACK_METRICS_LOG, CALLBACK_METRICS_LOG_MB,
+    # PROFILE_SLOW_MS, PROFILE_DIR
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        profile_slow_ms = environ.get('PROFILE_SLOW_MS')
+        return cls(log_path=environ.get('CALLBACK_METRICS_LOG') or None,
+                   log_max_bytes=int(float(environ.get('CALLBACK_METRICS_LOG_MB', 10)) * 1024 * 1024),
+                   profile_slow_ms=float(profile_slow_ms) if profile_slow_ms else None,
+                   profile_dir=environ.get('PROFILE_DIR', 'profiles'))
+
+    # Hit/miss counters shown with the callback metrics, e.g. register_cache('llm', llm_cache.stats)
+    def register_cache(self, name, stats):
+        self.caches[name] = stats
+
+    # Decorator for the callbacks, placed below @app.callback
+    def instrument(self, func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call = {'llm_ms': 0.0}
+            token = current_call.set(call)
+            profiler = self.start_profiler()
+            start = time.perf_counter()
+            status = 'ok'
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                status = 'prevented' if type(error).__name__ == 'PreventUpdate' else 'error'
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                current_call.reset(token)
+                with self.lock:
+                    self.stats.setdefault(name, CallbackStats()).add_call(elapsed_ms, call['llm_ms'], status)
+                record = {'callback': name, 'status': status, 'latency_ms': round(elapsed_ms, 3),
+                          'llm_ms': round(call['llm_ms'], 3), 'app_ms': round(elapsed_ms - call['llm_ms'], 3)}
+                if flask.has_request_context():
+                    # The payload size is only known once Dash has serialized the response
+                    flask.g.callback_record = record
+                else:
+                    self.log(record)
+                if profiler is not None:
+                    self.stop_profiler(profiler, name, elapsed_ms)
+        return wrapper
+
+    # Context manager around the LLM calls of a callback (`with metrics.llm_time():`), also usable
+    # around the awaits of the calls made from an event loop
+    def llm_time(self):
+        return LLMTimer()
+
+    # Flask hooks: size of the response of every callback request, then the log line
+    def init_app(self, server):
+        @server.after_request
+        def record_payload(response):
+            record = flask.g.pop('callback_record', None)
+            if record is not None:
+                size = response.calculate_content_length() or 0
+                with self.lock:
+                    self.stats.setdefault(record['callback'], CallbackStats()).add_payload(size)
+                record['payload_bytes'] = size
+                self.log(record)
+            return response
+
+        @server.route('/metrics/callbacks')
+        def callback_metrics():
+            return self.summary()
+
+    def log(self, record):
+        if logger.handlers:
+            logger.info(json.dumps({'ts': round(time.time(), 3), **record}))
+
+    def summary(self):
+        with self.lock:
+            callbacks = {name: stats.summary() for name, stats in sorted(self.stats.items())}
+        return {'callbacks': callbacks, 'caches': {name: stats() for name, stats in self.caches.items()}}
+
+    def start_profiler(self):
+        if self.profile_slow_ms is None:
+            return None
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        except ImportError:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another request of this process is already being profiled (Python 3.12+)
+                return None
+        return profiler
+
+    def stop_profiler(self, profiler, name, elapsed_ms):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if elapsed_ms < self.profile_slow_ms:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}-{int(elapsed_ms)}ms')
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(path + '.prof')
+        else:
+            with open(path + '.html', 'w') as f:
+                f.write(profiler.output_html())
+
+
+# Concurrent LLM calls of a callback (e.g. the recommendations of several categories) overlap: the
+# time with at least one call in flight is counted once, so the LLM time never exceeds the latency
+class LLMTimer:
+    def __enter__(self):
+        self.call = current_call.get()
+        if self.call is not None:
+            if not self.call.get('llm_active'):
+                self.call['llm_since'] = time.perf_counter()
+            self.call['llm_active'] = self.call.get('llm_active', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        if self.call is not None:
+            self.call['llm_active'] -= 1
+            if not self.call['llm_active']:
+                self.call['llm_ms'] += (time.perf_counter() - self.call['llm_since']) * 1000
+        return False
@@ -0,0 +1,173 @@
+import ast
+import re
+import unicodedata
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+# Local extraction of the macro categories mentioned in a query of the Query Section.
+# Queries are matched against a keyword/synonym index (Spanish and English): hand-written
+# synonyms of each category, plus words that are specific to one category in its product names
+# and Open Food Facts categories. The LLM is only asked when the local match is not confident,
+# and its answer is parsed with ast.literal_eval and validated against the known categories.
+
+# Hand-written synonyms, matched as whole phrases (longest first)
+seed_terms = {
+    'almond_milk': ['almond milk', 'almond drink', 'leche de almendra', 'leche de almendras', 'bebida de almendra',
+                    'bebida de almendras'],
+    'cereal_bars': ['cereal bar', 'cereal bars', 'granola bar', 'barrita', 'barritas', 'barrita de cereales',
+                    'barritas de cereales'],
+    'croissants': ['croissant', 'croissants', 'cruasan', 'cruasanes'],
+    'fresh_fruit': ['fruit', 'fresh fruit', 'fruta', 'frutas', 'fruta fresca'],
+    'fruit_juice': ['juice', 'fruit juice', 'orange juice', 'zumo', 'zumos', 'jugo', 'zumo de naranja'],
+    'ham': ['ham', 'jamon', 'jamon cocido', 'jamon de york', 'york'],
+    'honey': ['honey', 'miel'],
+    'hot_drink': ['hot drink', 'coffee', 'tea', 'hot chocolate', 'cocoa', 'bebida caliente', 'cafe', 'infusion',
+                  'chocolate caliente', 'cacao'],
+    'jam': ['jam', 'marmalade', 'mermelada', 'confitura'],
+    'milk': ['milk', 'leche'],
+    'muffins': ['muffin', 'muffins', 'cupcake', 'magdalena', 'magdalenas'],
+    'nuts': ['nut', 'nuts', 'almond', 'almonds', 'walnut', 'hazelnut', 'cashew', 'pistachio', 'peanut', 'peanuts',
+             'frutos secos', 'almendra', 'almendras', 'nuez', 'nueces', 'avellana', 'anacardo', 'pistacho',
+             'cacahuete', 'cacahuetes'],
+    'oat_milk': ['oat milk', 'oat drink', 'leche de avena', 'bebida de avena'],
+    'peanut_butter': ['peanut butter', 'crema de cacahuete', 'crema de cacahuetes', 'mantequilla de cacahuete',
+                      'crema de mani'],
+    'smoothies': ['smoothie', 'smoothies', 'batido', 'batidos'],
+    'soy_milk': ['soy milk', 'soya milk', 'soy drink', 'leche de soja', 'bebida de soja'],
+    'yogurt': ['yogurt', 'yoghurt', 'yogur', 'yogures', 'yogurts'],
+    'cereals': ['cereal', 'cereals', 'cereales', 'muesli', 'granola', 'corn flakes'],
+}
+
+# Function words and generic food vocabulary, never learned from the data
+stopwords = {'de', 'del', 'la', 'el', 'los', 'las', 'con', 'sin', 'para', 'y', 'en', 'a', 'al', 'un', 'una',
+             'the', 'and', 'with', 'without', 'for', 'of', 'in', 'i', 'want', 'quiero', 'some', 'algo',
+             'comida', 'alimento', 'producto', 'desayuno', 'breakfast', 'food', 'tomar', 'beber', 'bebida',
+             'sabor', 'estilo', 'natural', 'origen', 'vegetal', 'plant', 'based', 'sugar', 'azucar'}
+
+# Words learned from the data: minimum share of the rows containing the word that belong to
+# the category (purity), and minimum share of the category rows containing the word (support)
+min_purity = 0.6
+min_support = 0.05
+# A learned word only counts as a confident match if it is in at least this share of the category rows
+confident_support = 0.2
+# A match is confident when its weight (1 for hand-written synonyms) reaches this
+confident_weight = 0.9
+
+
+# str.translate table dropping the combining marks (accents), filled as characters are met
+class CombiningMarks(dict):
+    def __missing__(self, codepoint):
+        self[codepoint] = None if unicodedata.combining(chr(codepoint)) else codepoint
+        return self[codepoint]
+
+
+combining_marks = CombiningMarks()
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKD', str(text).lower()).translate(combining_marks)
+
+
+# Plural/singular are folded with a naive stem, applied the same way to the index and the queries
+def stem(token):
+    return token[:-1] if len(token) > 3 and token.endswith('s') and not token.endswith('ss') else token
+
+
+def tokenize(text):
+    return [stem(token) for token in re.findall(r'[a-z0-9]+', normalize(text))]
+
+
+# (rows, word ids) pairs of the given rows, from the text code of each row and the word ids of each text
+def row_words(rows, codes, words):
+    lengths = np.array([len(ids) for ids in words], dtype=np.int64)
+    flat_words = np.fromiter(chain.from_iterable(words), dtype=np.int64, count=int(lengths.sum()))
+    counts = lengths[codes]
+    # The k-th pair of a row takes the k-th word of its text: its position in flat_words is the start
+    # of the text plus the position of the pair minus the first pair of the row
+    text_starts = np.cumsum(lengths)[codes] - counts
+    row_starts = np.cumsum(counts) - counts
+    positions = np.repeat(text_starts - row_starts, counts) + np.arange(int(counts.sum()))
+    return np.repeat(rows, counts), flat_words[positions]
+
+
+class CategoryExtractor:
+    def __init__(self, categories, terms):
+        self.categories = list(categories)
+        # {tuple of tokens: (category, weight)}
+        self.terms = terms
+        self.max_phrase_length = max((len(phrase) for phrase in terms), default=1)
+
+    # Index built from the dataset: the hand-written synonyms of its categories, plus words specific
+    # to one category in the given text columns (e.g. product_name_es, categories)
+    @classmethod
+    def from_frame(cls, df, text_columns=('product_name_es', 'categories')):
+        categories = [str(category) for category in df['macro_category'].unique()]
+        terms = {}
+        for category, phrases in seed_terms.items():
+            if category in categories:
+                for phrase in phrases:
+                    terms[tuple(tokenize(phrase))] = (category, 1.0)
+
+        category_codes, category_names = pd.factorize(df['macro_category'])
+        vocabulary = {}
+        pairs = []
+        for column in [column for column in text_columns if column in df.columns]:
+            # Each distinct text of the column is tokenized once, and its words mapped back to the rows
+            codes, texts = pd.factorize(df[column])
+            words = [[vocabulary.setdefault(token, len(vocabulary)) for token in set(tokenize(text))
+                      if len(token) >= 4 and token not in stopwords and not token.isdigit()] for text in texts]
+            rows = np.flatnonzero((codes >= 0) & (category_codes >= 0))
+            pairs.append(row_words(rows, codes[rows], words))
+
+        if vocabulary:
+            n_words = len(vocabulary)
+            # A word found in several columns of a row counts once for the row (sorting is much faster
+            # than np.unique here)
+            keys = np.sort(np.concatenate([rows * n_words + word_ids for rows, word_ids in pairs]))
+            keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+            word_rows = np.bincount(category_codes[keys // n_words] * n_words + keys % n_words,
+                                    minlength=len(category_names) * n_words).reshape(len(category_names), n_words)
+            rows_per_category = np.bincount(category_codes[category_codes >= 0], minlength=len(category_names))
+            best = word_rows.argmax(axis=0)
+            count = word_rows[best, np.arange(n_words)]
+            purity = count / np.maximum(word_rows.sum(axis=0), 1)
+            support = count / rows_per_category[best]
+            tokens = list(vocabulary)
+            for i in np.flatnonzero((purity >= min_purity) & (support >= min_support)):
+                if (tokens[i],) in terms:
+                    continue
+                weight = purity[i] if support[i] >= confident_support else min(purity[i], support[i] / confident_support)
+                terms[(tokens[i],)] = (str(category_names[best[i]]), float(weight))
+        return cls(categories, terms)
+
+    # Returns (categories in order of mention, confident)
+    def extract(self, query):
+        tokens = tokenize(query)
+        found = {}
+        i = 0
+        while i < len(tokens):
+            # Longest phrase starting at token i
+            for length in range(min(self.max_phrase_length, len(tokens) - i), 0, -1):
+                match = self.terms.get(tuple(tokens[i:i + length]))
+                if match:
+                    category, weight = match
+                    found[category] = max(found.get(category, 0.0), weight)
+                    i += length
+                    break
+            else:
+                i += 1
+        confident = bool(found) and all(weight >= confident_weight for weight in found.values())
+        return list(found), confident
+
+    # Parse the list returned by the LLM, keeping only known categories
+    def parse_llm_categories(self, response_text):
+        match = re.search(r'\[.*?\]', response_text, re.DOTALL)
+        try:
+            values = ast.literal_eval(match.group(0)) if match else []
+        except (ValueError, SyntaxError):
+            return []
+        if not isinstance(values, (list, tuple)):
+            return []
+        return [value for value in dict.fromkeys(values) if isinstance(value, str) and value in self.categories]
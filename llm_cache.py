@@ -0,0 +1,124 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Persistent cache for the OpenAI chat completions of app.py.
+# Responses are stored in SQLite (shared by all the app workers), keyed on the model, the
+# messages and the dataset version, with a TTL and least-recently-used eviction.
+# Identical requests made at the same time in one process are coalesced: the first one calls
+# the API, the others wait for its answer.
+
+default_cache_path = 'llm_cache.sqlite3'
+default_ttl_seconds = 7 * 24 * 3600
+default_max_entries = 10_000
+
+
+def cache_key(model, messages, dataset_version):
+    payload = json.dumps({'model': model, 'messages': messages, 'dataset_version': dataset_version},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=default_cache_path, ttl_seconds=default_ttl_seconds, max_entries=default_max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.metrics = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0, 'evictions': 0, 'errors': 0}
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.connection:
+            if path != ':memory:':
+                self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                                    '(key TEXT PRIMARY KEY, response TEXT, created REAL, last_access REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    def count(self, metric, amount=1):
+        with self.lock:
+            self.metrics[metric] += amount
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if now - created > self.ttl_seconds:
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.metrics['expired'] += 1
+                return None
+            self.connection.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            return response
+
+    def set(self, key, response):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)', (key, response, now, now))
+            excess = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.connection.execute('DELETE FROM responses WHERE key IN '
+                                        '(SELECT key FROM responses ORDER BY last_access LIMIT ?)', (excess,))
+                self.metrics['evictions'] += excess
+
+    # Return the cached response for key, or compute it once even if several threads ask at the same time
+    def get_or_compute(self, key, compute):
+        response = self.get(key)
+        if response is not None:
+            self.count('hits')
+            return response
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            self.count('coalesced')
+            return future.result()
+
+        try:
+            # Another request may have stored it between the first lookup and now
+            response = self.get(key)
+            if response is not None:
+                self.count('hits')
+            else:
+                self.count('misses')
+                response = compute()
+                self.set(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            self.count('errors')
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics)
+            stats['entries'] = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
+
+
+# Wraps an OpenAI-compatible client (anything with chat.completions.create) and returns the
+# text of the first choice, going through the cache
+class CachedChatClient:
+    def __init__(self, client, cache, dataset_version=''):
+        self.client = client
+        self.cache = cache
+        self.dataset_version = dataset_version
+
+    def complete(self, model, messages):
+        def call_api():
+            response = self.client.chat.completions.create(model=model, messages=messages)
+            return response.choices[0].message.content.strip()
+        return self.cache.get_or_compute(cache_key(model, messages, self.dataset_version), call_api)
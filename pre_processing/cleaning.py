@@ -0,0 +1,249 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Cleaning stage of the pipeline: parsing of the per-category exports, row validation, unit
+# conversion and imputation of the missing values.
+#
+# The exports are parsed with Arrow's multi-threaded CSV reader, every column as text. Rows are
+# then checked in a few vectorized passes; a row is rejected, with the first failed check as
+# reason, if:
+#   - the line has more or fewer fields than the header (malformed_line);
+#   - the code is missing or not a barcode (missing_code, invalid_code);
+#   - the Spanish product name is missing (missing_name);
+#   - a nutrient value is not a number (invalid_nutrient) or is impossible per 100 g
+#     (nutrient_out_of_range, e.g. 1392 g of salt).
+# Rejected rows are not dropped silently: they go to a quarantine file (<dataset>.quarantine.tsv,
+# with the reason and the raw line of malformed lines) and are counted per category and reason
+# in <dataset>.quarantine.json.
+
+# Allowed values of the nutrients, per 100 g (an energy above 900 kcal is more than pure fat)
+nutrient_ranges = {
+    'energy-kcal_value': (0, 900),
+    'sugars_value': (0, 100),
+    'fat_value': (0, 100),
+    'saturated-fat_value': (0, 100),
+    'proteins_value': (0, 100),
+    'salt_value': (0, 100),
+    'fiber_value': (0, 100),
+}
+
+# Text quantities converted to grams, in new <column>_g columns (the texts are kept for display)
+gram_columns = {'quantity': 'quantity_g', 'serving_size': 'serving_size_g'}
+# Grams per unit. Volumes are converted with the density of water: most of the products sold by
+# volume are drinks, milks and yogurts, for which the error is a few percent
+unit_grams = {
+    'kg': 1000.0, 'kgs': 1000.0, 'kilo': 1000.0, 'kilos': 1000.0, 'kilogramo': 1000.0, 'kilogramos': 1000.0,
+    'g': 1.0, 'gr': 1.0, 'grs': 1.0, 'gramo': 1.0, 'gramos': 1.0, 'gram': 1.0, 'grams': 1.0, 'mg': 0.001,
+    'l': 1000.0, 'lt': 1000.0, 'litro': 1000.0, 'litros': 1000.0, 'litre': 1000.0, 'litres': 1000.0,
+    'dl': 100.0, 'cl': 10.0, 'ml': 1.0,
+    'oz': 28.3495, 'lb': 453.592,
+}
+# "[count x] amount unit", e.g. "500 g", "1,5 L", "4 x 125 g", "1 vaso 200 ml"; the first match is used
+quantity_pattern = (r'(?:(\d+)\s*[x×]\s*)?(\d+(?:[.,]\d+)?)\s*('
+                    + '|'.join(sorted(unit_grams, key=len, reverse=True)) + r')\b\.?')
+
+# Values of the missing texts and nutrients after cleaning
+text_fill_value = 'Unknown'
+text_columns = ['brands', 'categories', 'quantity', 'serving_size', 'ingredients_text_es']
+fill_values = {**{col: text_fill_value for col in text_columns}, **{col: 0 for col in nutrient_ranges}}
+
+rejection_reasons = ['malformed_line', 'missing_code', 'invalid_code', 'missing_name', 'invalid_nutrient',
+                     'nutrient_out_of_range']
+# Columns of the quarantine file, before and after the source columns
+quarantine_prefix = ['macro_category', 'reason', 'detail']
+quarantine_suffix = ['raw_line']
+
+# Size of the blocks read by the CSV reader in streaming mode
+default_block_size = 4 << 20
+
+
+# Arrow reader options: every listed column as text (missing ones as empty columns),
+# malformed lines passed to `malformed` and skipped
+def csv_options(columns, malformed):
+    def skip_row(row):
+        malformed.append(row)
+        return 'skip'
+
+    parse_options = pacsv.ParseOptions(delimiter='\t', newlines_in_values=True, invalid_row_handler=skip_row)
+    convert_options = pacsv.ConvertOptions(include_columns=columns, include_missing_columns=True,
+                                           column_types={col: pa.string() for col in columns}, strings_can_be_null=True)
+    return parse_options, convert_options
+
+
+# Whole export as a text frame, plus its malformed lines
+def read_export(path, columns):
+    malformed = []
+    parse_options, convert_options = csv_options(columns, malformed)
+    table = pacsv.read_csv(path, parse_options=parse_options, convert_options=convert_options)
+    return table.to_pandas(), malformed
+
+
+# Export as text frames of about `chunksize` rows (with the malformed lines met since the previous one),
+# so memory does not depend on the size of the file
+def iter_export(path, columns, chunksize, block_size=default_block_size):
+    malformed = []
+    parse_options, convert_options = csv_options(columns, malformed)
+    reader = pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=block_size),
+                            parse_options=parse_options, convert_options=convert_options)
+    batches, rows = [], 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= chunksize:
+            yield pa.Table.from_batches(batches).to_pandas(), malformed[:]
+            malformed.clear()
+            batches, rows = [], 0
+    if batches or malformed:
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+        yield table.to_pandas(), malformed[:]
+
+
+# Numbers of a text column (NaN if missing or not a number). The Arrow cast is tried first;
+# columns with a bad value (or a decimal comma) go through the slower lenient parser
+def parse_numbers(text):
+    try:
+        return text.astype('float64')
+    except (ValueError, TypeError):
+        return pd.to_numeric(text.str.strip().str.replace(',', '.', regex=False), errors='coerce').astype('float64')
+
+
+# Grams of quantity texts ("2 x 125 g" -> 250.0), NaN when there is no recognizable amount.
+# Each distinct text is parsed once
+def parse_grams(text):
+    codes, uniques = pd.factorize(text)
+    parts = pd.Series(uniques, dtype='str').str.lower().str.extract(quantity_pattern)
+    count = parts[0].astype('float64').fillna(1.0)
+    amount = parts[1].str.replace(',', '.', regex=False).astype('float64')
+    grams = (count * amount * parts[2].map(unit_grams).astype('float64')).to_numpy()
+    return np.where(codes >= 0, grams[np.maximum(codes, 0)] if len(grams) else np.nan, np.nan)
+
+
+# Rejected records of the malformed lines of a category
+def malformed_records(malformed, category):
+    return pd.DataFrame({
+        'macro_category': category,
+        'reason': 'malformed_line',
+        'detail': [f'expected {row.expected_columns} fields, saw {row.actual_columns}' for row in malformed],
+        'raw_line': [row.text for row in malformed],
+    }, dtype='str')
+
+
+# Validates the rows of a text frame read from the export of `category`.
+# Returns the valid rows (nutrients as floats, with macro_category and the gram columns) and
+# the rejected ones (texts as read, with macro_category, reason and detail)
+def clean_export(df, category, malformed=()):
+    # (reason, rows failing the check, column shown in the detail)
+    code = df['code'].str.strip()
+    checks = [
+        ('missing_code', (code.isna() | (code == '')).to_numpy(), None),
+        ('invalid_code', (~code.str.fullmatch(r'\d+', na=True)).to_numpy(), 'code'),
+        ('missing_name', df['product_name_es'].isna().to_numpy(), None),
+    ]
+    numbers = {}
+    for col, (low, high) in nutrient_ranges.items():
+        if col not in df.columns:
+            continue
+        numbers[col] = parse_numbers(df[col])
+        checks.append(('invalid_nutrient', (df[col].notna() & numbers[col].isna()).to_numpy(), col))
+        checks.append(('nutrient_out_of_range', ((numbers[col] < low) | (numbers[col] > high)).to_numpy(), col))
+
+    # First failed check of every row; the details are only built for the rejected rows
+    failed = np.column_stack([mask for _, mask, _ in checks])
+    rejected_mask = failed.any(axis=1)
+    first = failed.argmax(axis=1)
+    reason = np.full(len(df), '', dtype=object)
+    detail = np.full(len(df), '', dtype=object)
+    for index, (name, _, col) in enumerate(checks):
+        rows = np.flatnonzero(rejected_mask & (first == index))
+        reason[rows] = name
+        if col is not None and len(rows):
+            detail[rows] = [f'{col}={value}' for value in df[col].iloc[rows]]
+
+    valid = df[~rejected_mask].assign(**{col: values[~rejected_mask] for col, values in numbers.items()})
+    valid['macro_category'] = category
+    for col, gram_col in gram_columns.items():
+        if col in valid.columns:
+            valid[gram_col] = parse_grams(valid[col])
+
+    rejected = df[rejected_mask].astype('str')
+    rejected.insert(0, 'macro_category', category)
+    rejected.insert(1, 'reason', reason[rejected_mask])
+    rejected.insert(2, 'detail', detail[rejected_mask])
+    if malformed:
+        rejected = pd.concat([rejected, malformed_records(malformed, category)], ignore_index=True)
+    return valid.reset_index(drop=True), rejected.reindex(columns=quarantine_columns(df.columns))
+
+
+def quarantine_columns(columns):
+    return quarantine_prefix + [col for col in columns if col not in quarantine_prefix] + quarantine_suffix
+
+
+# Every imputation in one fillna: 'Unknown' for the texts, 0 for the nutrients.
+# Categorical columns (read from Parquet/Feather) need the fill value among their categories first
+def impute(df, values=fill_values):
+    values = {col: value for col, value in values.items() if col in df.columns}
+    categories = {col: df[col].cat.add_categories([value]) for col, value in values.items()
+                  if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories}
+    return df.assign(**categories).fillna(values)
+
+
+# Rejected rows appended to the quarantine file as they come, and counts of the kept and rejected
+# rows per category and reason, written to <quarantine>.json on close
+class Quarantine:
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = quarantine_columns(columns)
+        self.kept = {}
+        self.rejected = {}
+        self.header_written = False
+
+    def add(self, category, kept_rows, rejected):
+        self.kept[category] = self.kept.get(category, 0) + kept_rows
+        counts = self.rejected.setdefault(category, {})
+        for reason, count in rejected['reason'].value_counts().items():
+            counts[reason] = counts.get(reason, 0) + int(count)
+        if len(rejected):
+            rejected.reindex(columns=self.columns).to_csv(self.path, sep='\t', index=False, mode='a' if self.header_written else 'w',
+                                                          header=not self.header_written)
+            self.header_written = True
+
+    def summary(self):
+        reasons = {}
+        for counts in self.rejected.values():
+            for reason, count in counts.items():
+                reasons[reason] = reasons.get(reason, 0) + count
+        kept, rejected = sum(self.kept.values()), sum(reasons.values())
+        return {
+            'rows_read': kept + rejected,
+            'rows_kept': kept,
+            'rows_rejected': rejected,
+            'reasons': {reason: reasons[reason] for reason in rejection_reasons if reason in reasons},
+            'categories': {category: {'kept': self.kept.get(category, 0), 'rejected': self.rejected.get(category, {})}
+                           for category in sorted(self.kept.keys() | self.rejected.keys())},
+        }
+
+    def close(self):
+        if not self.header_written:
+            pd.DataFrame(columns=self.columns).to_csv(self.path, sep='\t', index=False)
+        with open(quarantine_counts_path(self.path), 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        return self.summary()
+
+
+# Print the quarantine counts
+def report_quarantine(summary, path):
+    reasons = ', '.join(f'{reason}: {count}' for reason, count in summary['reasons'].items())
+    print(f"Rows read: {summary['rows_read']}, kept: {summary['rows_kept']}, "
+          f"quarantined: {summary['rows_rejected']}" + (f" ({reasons})" if reasons else '') + f" -> '{path}'")
+
+
+def quarantine_path(dataset_path):
+    return f"{os.path.splitext(dataset_path)[0]}.quarantine.tsv"
+
+
+def quarantine_counts_path(quarantine_file):
+    return f"{os.path.splitext(quarantine_file)[0]}.json"
@@ -1,62 +1,72 @@
-import pandas as pd
-import numpy as np
-
-# Load the cleaned data
-df = pd.read_csv('final_cleaned_breakfast_products_with_macro_category.csv')
-
-# Step 1: Handle Missing Values
-# Drop rows where 'product_name_es' is missing
-df = df.dropna(subset=['product_name_es'])
-
-# Fill missing values for other columns
-df['brands'].fillna('Unknown', inplace=True)
-df['categories'].fillna('Unknown', inplace=True)
-df['quantity'].fillna('Unknown', inplace=True)
-df['serving_size'].fillna('Unknown', inplace=True)
-df['energy-kcal_value'].fillna(0, inplace=True)
-df['sugars_value'].fillna(0, inplace=True)
-df['fat_value'].fillna(0, inplace=True)
-df['saturated-fat_value'].fillna(0, inplace=True)
-df['proteins_value'].fillna(0, inplace=True)
-df['salt_value'].fillna(0, inplace=True)
-df['fiber_value'].fillna(0, inplace=True)
-df['ingredients_text_es'].fillna('Unknown', inplace=True)
-
-# Step 2: Create Ad Hoc Columns for Health Score Calculation
-df['adj_sugars_value'] = df['sugars_value'].replace(0, np.nan)
-df['adj_fat_value'] = df['fat_value'].replace(0, np.nan)
-df['adj_saturated_fat_value'] = df['saturated-fat_value'].replace(0, np.nan)
-df['adj_proteins_value'] = df['proteins_value'].replace(0, np.nan)
-df['adj_salt_value'] = df['salt_value'].replace(0, np.nan)
-df['adj_fiber_value'] = df['fiber_value'].replace(0, np.nan)
-
-# Normalize the nutritional values to a common scale (e.g., per 100 grams)
-df['normalized_calories'] = df['energy-kcal_value'] / df['energy-kcal_value'].max()
-df['normalized_sugars'] = df['adj_sugars_value'] / df['adj_sugars_value'].max()
-df['normalized_fat'] = df['adj_fat_value'] / df['adj_fat_value'].max()
-df['normalized_saturated_fat'] = df['adj_saturated_fat_value'] / df['adj_saturated_fat_value'].max()
-df['normalized_proteins'] = df['adj_proteins_value'] / df['adj_proteins_value'].max()
-df['normalized_salt'] = df['adj_salt_value'] / df['adj_salt_value'].max()
-df['normalized_fiber'] = df['adj_fiber_value'] / df['adj_fiber_value'].max()
-
-# Calculate health score with a complex formula
-# This is a sample formula: you can adjust the weights based on nutritional guidelines or expert recommendations
-df['health_score'] = (df['normalized_proteins'] + df['normalized_fiber']) / (df['normalized_sugars'] + df['normalized_fat'] + df['normalized_saturated_fat'] + df['normalized_salt'] + 1)
-
-# Drop temporary normalization and adjustment columns
-df.drop(['normalized_calories', 'normalized_sugars', 'normalized_fat', 'normalized_saturated_fat', 
-         'normalized_proteins', 'normalized_salt', 'normalized_fiber',
-         'adj_sugars_value', 'adj_fat_value', 'adj_saturated_fat_value', 
-         'adj_proteins_value', 'adj_salt_value', 'adj_fiber_value','product_name_en'], axis=1, inplace=True)
-
-df.head()
-
-# store all the infos of a row in a dictionary to check if everything is correct
-row = df.iloc[0]
-row_dict = row.to_dict()
-print(row_dict)
-# Save the cleaned dataframe to a new CSV file with standard line terminators
-df.to_csv('final_preprocessed_breakfast_products_with_health_score.csv', index=False)
-
-print("Data preprocessing completed. Cleaned data saved to 'final_preprocessed_breakfast_products_with_health_score.csv'.")
+import argparse
+import os
 
+import cleaning
+import dataset_io
+import dedup
+import health_score
+import normalization
+import search_index
+
+input_file = dataset_io.combined_output_file
+output_file = dataset_io.preprocessed_output_file
+
+# Step 1: Handle Missing Values (rows failing validation were set apart by df_combiner.py)
+def clean_products(df):
+    # Drop rows where 'product_name_es' is missing
+    df = df.dropna(subset=['product_name_es'])
+    # Fill missing values for other columns, all in one pass
+    df = cleaning.impute(df)
+    return df.drop(columns=['product_name_en'], errors='ignore')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean the combined dataset and add the health score.')
+    parser.add_argument('--input', default=input_file,
+                        help='Combined dataset from df_combiner.py (falls back to the CSV hand-off if missing)')
+    parser.add_argument('--output', default=output_file,
+                        help='Path of the preprocessed dataset; the extension picks the format (.parquet, .feather or .csv)')
+    parser.add_argument('--csv', action='store_true', help='Also export the preprocessed dataset as CSV')
+    parser.add_argument('--weights', default='',
+                        help='Health score weights to override, e.g. sugars_value=2,energy-kcal_value=0.5')
+    args = parser.parse_args()
+
+    # Load the cleaned data
+    input_path = args.input if os.path.exists(args.input) else dataset_io.find_dataset(args.input)
+    df = dataset_io.read_dataset(input_path)
+
+    # Merge the duplicate and near-duplicate products, before the missing nutrients are imputed
+    df, duplicates = dedup.deduplicate(df)
+    df = clean_products(df)
+    # Step 2: Health score, normalized by the maxima of the whole dataset
+    weights = health_score.parse_weights(args.weights)
+    maxima = health_score.compute_maxima(df)
+    df = health_score.add_health_score(df, maxima, weights)
+    # Step 3: Normalized copies of the nutrient columns (the raw values are kept)
+    scaler_parameters = normalization.fit_scaler(df)
+    df = normalization.add_normalized_columns(df, scaler_parameters)
+
+    # store all the infos of a row in a dictionary to check if everything is correct
+    row = df.iloc[0]
+    row_dict = row.to_dict()
+    print(row_dict)
+    # Save the cleaned dataframe
+    dataset_io.write_dataset(df, args.output)
+    # Memory-mapped store read by the app
+    dataset_io.write_dataset(df, dataset_io.with_format(args.output, 'arrow'))
+    # Maxima and weights of the score, to score new batches consistently (health_score.rescore)
+    health_score.save_score_parameters(health_score.score_parameters_path(args.output), maxima, weights)
+    normalization.save_scaler_parameters(normalization.scaler_parameters_path(args.output), scaler_parameters)
+    # Full-text search index over the rows of the dataset, loaded by the app
+    search_index.SearchIndex.from_frame(df).save(search_index.search_index_path(args.output))
+    # Records merged into another product, with the product they were merged into
+    dedup.save_duplicates([duplicates], dedup.duplicates_path(args.output))
+    if args.csv and dataset_io.dataset_format(args.output) != 'csv':
+        dataset_io.write_dataset(df, dataset_io.with_format(args.output, 'csv'))
+
+    dedup.report_duplicates(len(duplicates), len(df), dedup.duplicates_path(args.output))
+    print(f"Data preprocessing completed. Cleaned data saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
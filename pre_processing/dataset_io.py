@@ -0,0 +1,128 @@
+import glob
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Reading and writing of the datasets passed between the pipeline stages and the app.
+# The format is chosen from the file extension:
+#   .parquet  typed, compressed columnar file (default)
+#   .feather  Arrow IPC file, uncompressed and fastest to load
+#   .arrow    uncompressed Arrow IPC file, memory-mapped by the app (see product_store.py)
+#   .csv      plain text export
+
+# Repetitive text columns stored as categoricals (dictionary-encoded in Parquet/Feather/Arrow):
+# few distinct values, or long texts shared by many rows (e.g. the 'Unknown' placeholder)
+categorical_columns = ['macro_category', 'brands', 'categories', 'quantity', 'serving_size', 'ingredients_text_es']
+
+# In-memory types of the columns of the final dataset, applied by compact_frame. Text columns
+# that are unique per row stay Arrow-backed strings; float columns not listed are downcast too
+frame_schema = {
+    'code': 'str',
+    'product_name_es': 'str',
+    **{col: 'category' for col in categorical_columns},
+}
+compact_float_dtype = 'float32'
+
+supported_formats = ['parquet', 'feather', 'arrow', 'csv']
+
+# Default paths of the pipeline outputs: the combined exports (df_combiner.py) and the
+# preprocessed dataset read by the app (combined_df_explorer.py, incremental_build.py)
+combined_output_file = 'final_cleaned_breakfast_products_with_macro_category.parquet'
+preprocessed_output_file = 'final_preprocessed_breakfast_products_with_health_score.parquet'
+
+
+def dataset_format(path):
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext not in supported_formats:
+        raise ValueError(f"Unsupported dataset format '{ext}' for {path} (expected one of {supported_formats})")
+    return ext
+
+
+# Replace the extension of a dataset path, e.g. to get the CSV export of a Parquet file
+def with_format(path, fmt):
+    return f"{os.path.splitext(path)[0]}.{fmt}"
+
+
+# The per-category CSV exports of input_dir, sorted. The CSV exports of the pipeline outputs (the
+# `outputs` given, and the default ones in input_dir or in the working directory) may be written
+# next to them and are skipped
+def category_files(input_dir, outputs=()):
+    defaults = [combined_output_file, preprocessed_output_file]
+    paths = [*outputs, *defaults, *(os.path.join(input_dir, path) for path in defaults)]
+    excluded = {os.path.abspath(with_format(path, 'csv')) for path in paths}
+    return sorted(f for f in glob.glob(os.path.join(input_dir, '*.csv')) if os.path.abspath(f) not in excluded)
+
+
+# Categories are kept sorted and without unused values, so the encoding of a column only
+# depends on its values (and not on how the frame was filtered or concatenated before)
+def encode_categoricals(df):
+    df = df.copy()
+    for col in categorical_columns:
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            series = df[col].cat.remove_unused_categories()
+            df[col] = series.cat.reorder_categories(sorted(series.cat.categories))
+        else:
+            df[col] = df[col].astype('category')
+    return df
+
+
+# Compact in-memory copy of a frame: categoricals for the repetitive text columns and float32
+# for the numbers. The files keep float64, so exact values should be read from them (or from
+# the store) for display. downcast_floats=False keeps the float columns as they are, e.g. when
+# they are views of a memory-mapped file (a float32 copy would be private memory)
+def compact_frame(df, schema=frame_schema, downcast_floats=True):
+    columns = {}
+    for col in df.columns:
+        dtype = schema.get(col)
+        if dtype == 'category' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            columns[col] = df[col].astype('category')
+        elif dtype == 'str' and df[col].dtype != 'str':
+            columns[col] = df[col].astype('str')
+        elif dtype is None and downcast_floats and df[col].dtype.kind == 'f':
+            columns[col] = df[col].astype(compact_float_dtype)
+    return df.assign(**columns) if columns else df
+
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True, index=False).sum() / 1e6
+
+
+def write_dataset(df, path):
+    fmt = dataset_format(path)
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+        return
+    df = encode_categoricals(df).reset_index(drop=True)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        df.to_feather(path)
+    else:
+        # No compression and a single record batch, so the file can be memory-mapped and its
+        # columns read without copying (a column split in several batches is concatenated by to_pandas)
+        table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+        feather.write_feather(table, path, compression='uncompressed', chunksize=max(len(df), 1))
+
+
+def read_dataset(path, columns=None):
+    fmt = dataset_format(path)
+    if fmt == 'csv':
+        df = pd.read_csv(path, usecols=columns)
+    elif fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_feather(path, columns=columns)
+    # CSV files (and Parquet written in streaming mode) carry no categorical metadata
+    return encode_categoricals(df)
+
+
+# Return the first existing path among the given formats, so a stage can fall back to the CSV hand-off
+def find_dataset(path, formats=('parquet', 'feather', 'csv')):
+    for fmt in formats:
+        candidate = with_format(path, fmt)
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"No dataset found for {with_format(path, '*')}")
@@ -0,0 +1,228 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from search_index import stopwords
+
+# Near-duplicate detection, run by the pipeline on the cleaned rows before the missing values
+# are imputed. Records of the same macro category are merged when they have:
+#   - the same code (the same product listed twice), or
+#   - the same brand, the same name once accents, case, punctuation, stopwords and word order
+#     are ignored ("Jamón cocido" / "JAMON COCIDO" / "Cocido, jamón") and compatible nutrient
+#     values, or
+#   - the same brand, similar names (Jaccard similarity of their character trigrams of at least
+#     similar_name_threshold) and compatible nutrient values ("Jamon cocido extra" / "Jamón cocido extra.").
+# Candidate pairs are found by sorted neighbourhood instead of comparing every pair: the records
+# of a name are sorted by energy, the distinct names of each (category, brand) block by their
+# words and by their sorted words, and each one is only compared with the next `window` ones.
+# Merges are transitive.
+# A merged product keeps the texts of its most complete record (the one with the most nutrient
+# values, the first one on ties), completed by the other records. Its nutrient values are the
+# median of the records when they all agree, and the values of the most complete record otherwise
+# (e.g. a code listed twice with different values). Brands are compared by the first one listed
+# ("Vemondo,Lidl" -> "vemondo").
+
+nutrient_columns = ['energy-kcal_value', 'sugars_value', 'fat_value', 'saturated-fat_value',
+                    'proteins_value', 'salt_value', 'fiber_value']
+similar_name_threshold = 0.8
+window = 5
+# Two values of a nutrient are compatible if they differ by at most 10% of the larger one plus 0.5
+# (so that values close to 0 are not told apart by rounding)
+relative_tolerance = 0.1
+absolute_tolerance = 0.5
+
+# Columns of the duplicates report: the kept product, then the merged record
+report_columns = ['macro_category', 'code', 'product_name_es', 'duplicate_code', 'duplicate_name']
+
+
+# Lowercased, accent-folded words of texts ("Jamón cocido, extra" -> "jamon cocido extra"), as in
+# search_index.tokenize, computed by Arrow over the whole column. Stopwords are dropped with `drop`
+def folded_words(texts, drop=()):
+    texts = (texts.str.lower().str.normalize('NFKD').str.replace('[\u0300-\u036f]', '', regex=True)
+             .str.replace(r'[^a-z0-9]+', '  ', regex=True))
+    if drop:
+        texts = (' ' + texts + ' ').str.replace(r' (?:' + '|'.join(sorted(drop)) + ') ', ' ', regex=True)
+    return texts.str.replace(r' +', ' ', regex=True).str.strip()
+
+
+# Name key: the words of the name without stopwords ("Jamón cocido de York" -> "jamon cocido york")
+def name_keys(names):
+    return folded_words(names, stopwords)
+
+
+# Brand key: the words of the first brand ("Vemondo,Lidl" -> "vemondo")
+def brand_keys(brands):
+    return folded_words(brands.str.replace(',.*', '', regex=True))
+
+
+# Integer ids of string keys, increasing with the keys (so that sorting ids sorts the keys)
+def sorted_ids(keys):
+    uniques, ids = np.unique(keys, return_inverse=True)
+    return ids, uniques
+
+
+# Key id of every row, with the sorted keys; the keys are computed once per distinct text
+# ('' for missing values)
+def row_ids(series, keys):
+    codes, uniques = pd.factorize(series.astype('str'), use_na_sentinel=False)
+    key_ids, unique_keys = sorted_ids(np.array(keys(pd.Series(uniques, dtype='str').fillna('')), dtype=object))
+    return key_ids[codes], unique_keys
+
+
+# (row, row) pairs of the rows with the same values in all `columns` (integer arrays);
+# rows with a negative value in any column are left out
+def same_key_pairs(*columns):
+    valid = np.all([column >= 0 for column in columns], axis=0)
+    rows = np.flatnonzero(valid)
+    order = rows[np.lexsort([column[rows] for column in columns[::-1]])]
+    same = np.all([column[order[1:]] == column[order[:-1]] for column in columns], axis=0)
+    return order[:-1][same], order[1:][same]
+
+
+# (row, row) pairs of each row of `order` with the next `window` ones of the same block (same values
+# in all `blocks` columns)
+def window_pairs(order, *blocks):
+    left, right = [], []
+    for offset in range(1, window + 1):
+        a, b = order[:-offset], order[offset:]
+        same_block = np.all([block[a] == block[b] for block in blocks], axis=0)
+        left.append(a[same_block])
+        right.append(b[same_block])
+    return np.concatenate(left), np.concatenate(right)
+
+
+def trigrams(text):
+    text = f' {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Rows of the candidate pairs whose nutrient values are compatible
+def compatible_nutrients(values, left, right):
+    a, b = values[left], values[right]
+    with np.errstate(invalid='ignore'):
+        close = np.abs(a - b) <= relative_tolerance * np.maximum(np.abs(a), np.abs(b)) + absolute_tolerance
+    return np.all(close | np.isnan(a) | np.isnan(b), axis=1)
+
+
+# (row, row) pairs of similar names of the same category and brand, by sorted neighbourhood.
+# name_ids index unique_names (names in word order), sorted_word_ids the same names with sorted words
+def similar_name_pairs(category, brand, name_ids, unique_names, sorted_word_ids, values):
+    # One row per distinct (category, brand, name), without the empty names
+    triples = (category.astype(np.int64) * (brand.max() + 1) + brand) * len(unique_names) + name_ids
+    _, first_rows = np.unique(triples, return_index=True)
+    first_rows = first_rows[unique_names[name_ids[first_rows]] != '']
+    lengths = np.array([len(name) for name in unique_names])
+
+    pairs = [window_pairs(first_rows[np.lexsort((sort_key[first_rows], brand[first_rows], category[first_rows]))],
+                          category, brand)
+             for sort_key in [name_ids, sorted_word_ids[name_ids]]]
+    left, right = np.concatenate([pair[0] for pair in pairs]), np.concatenate([pair[1] for pair in pairs])
+
+    # Cheap filters first: a trigram Jaccard of t needs a length ratio of about t, then the nutrients
+    length_a, length_b = lengths[name_ids[left]] + 2, lengths[name_ids[right]] + 2
+    keep = np.minimum(length_a, length_b) >= similar_name_threshold * np.maximum(length_a, length_b)
+    left, right = left[keep], right[keep]
+    keep = compatible_nutrients(values, left, right)
+    left, right = left[keep], right[keep]
+
+    # The same two names often meet in several blocks: each distinct pair of names is compared once
+    name_pairs, pair_ids = np.unique(name_ids[left].astype(np.int64) * len(unique_names) + name_ids[right],
+                                     return_inverse=True)
+    shingles = {}
+    similar = np.zeros(len(name_pairs), dtype=bool)
+    for index, (a, b) in enumerate(zip(*np.divmod(name_pairs, len(unique_names)))):
+        for name_id in (a, b):
+            if name_id not in shingles:
+                shingles[name_id] = trigrams(unique_names[name_id])
+        union = len(shingles[a] | shingles[b])
+        similar[index] = len(shingles[a] & shingles[b]) >= similar_name_threshold * union
+    similar = similar[pair_ids]
+    return left[similar], right[similar]
+
+
+# Group label of every row: rows linked by a same code, same name or similar name pair share a label
+def duplicate_groups(df):
+    category, _ = row_ids(df['macro_category'], lambda categories: categories)
+    code_ids = pd.factorize(df['code'])[0]
+    brand, _ = row_ids(df['brands'], brand_keys)
+    name_ids, unique_names = row_ids(df['product_name_es'], name_keys)
+    # Same name whatever the word order: the ids of the names with sorted words (-1 for no name)
+    sorted_word_ids, sorted_names = sorted_ids(np.array([' '.join(sorted(name.split())) for name in unique_names], dtype=object))
+    same_name_ids = np.where(sorted_names[sorted_word_ids] == '', -1, sorted_word_ids)[name_ids]
+    present = [col for col in nutrient_columns if col in df.columns]
+    values = df[present].to_numpy(dtype=np.float64)
+
+    # The same name is not enough either: the nutrient values have to be compatible too. The records
+    # of a name are sorted by energy, so that the compatible ones are next to each other
+    rows = np.flatnonzero(same_name_ids >= 0)
+    energy = values[:, present.index('energy-kcal_value')] if 'energy-kcal_value' in present else np.zeros(len(df))
+    order = rows[np.lexsort((energy[rows], same_name_ids[rows], brand[rows], category[rows]))]
+    same_name = window_pairs(order, category, brand, same_name_ids)
+    keep = compatible_nutrients(values, *same_name)
+    pairs = [same_key_pairs(category, code_ids), (same_name[0][keep], same_name[1][keep]),
+             similar_name_pairs(category, brand, name_ids, unique_names, sorted_word_ids, values)]
+    left = np.concatenate([pair[0] for pair in pairs])
+    right = np.concatenate([pair[1] for pair in pairs])
+    graph = coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(len(df), len(df)))
+    return connected_components(graph, directed=False)[1]
+
+
+# Merges the duplicates of a cleaned frame. Returns the deduplicated frame (in the order of the
+# kept records) and the report of the merged records
+def deduplicate(df):
+    df = df.reset_index(drop=True)
+    if df.empty:
+        return df, pd.DataFrame(columns=report_columns)
+    labels = duplicate_groups(df)
+    sizes = np.bincount(labels)
+    duplicated = np.flatnonzero(sizes[labels] > 1)
+    if not len(duplicated):
+        return df, pd.DataFrame(columns=report_columns)
+
+    # Records of each group, the most complete first
+    present = [col for col in nutrient_columns if col in df.columns]
+    completeness = df[present].notna().sum(axis=1).to_numpy()
+    order = duplicated[np.lexsort((duplicated, -completeness[duplicated], labels[duplicated]))]
+    records = df.iloc[order]
+    groups = records.groupby(labels[order], sort=False)
+    # groupby().first() takes the first non-missing value of each column: the kept record's, if it has one
+    merged = groups.first()
+    # Nutrients: the median of the records if they agree, the kept record's values otherwise
+    low, high = groups[present].min(), groups[present].max()
+    tolerance = relative_tolerance * np.maximum(low.abs(), high.abs()) + absolute_tolerance
+    agree = ((high - low <= tolerance) | low.isna()).all(axis=1)
+    merged.loc[agree, present] = groups[present].median()[agree]
+    kept_rows = order[np.r_[True, labels[order][1:] != labels[order][:-1]]]
+    merged.index = kept_rows
+    merged = merged.astype(df.dtypes.to_dict())
+
+    result = pd.concat([df.drop(index=duplicated), merged]).sort_index(kind='stable').reset_index(drop=True)
+
+    kept = pd.Series(kept_rows, index=labels[kept_rows])
+    removed = np.setdiff1d(duplicated, kept_rows)
+    kept_of_removed = kept.loc[labels[removed]].to_numpy()
+    report = pd.DataFrame({
+        'macro_category': df['macro_category'].to_numpy()[removed],
+        'code': df['code'].to_numpy()[kept_of_removed],
+        'product_name_es': df['product_name_es'].to_numpy()[kept_of_removed],
+        'duplicate_code': df['code'].to_numpy()[removed],
+        'duplicate_name': df['product_name_es'].to_numpy()[removed],
+    })
+    return result, report
+
+
+# Report of the merged records, next to the dataset
+def save_duplicates(reports, path):
+    pd.concat([report for report in reports if len(report)] or [pd.DataFrame(columns=report_columns)],
+              ignore_index=True).to_csv(path, sep='\t', index=False)
+
+
+# Print the number of merged records
+def report_duplicates(merged, rows, path):
+    print(f"Duplicates merged: {merged} records, {rows} products left -> '{path}'")
+
+
+def duplicates_path(dataset_path):
+    return f"{os.path.splitext(dataset_path)[0]}.duplicates.tsv"
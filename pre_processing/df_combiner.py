@@ -1,37 +1,199 @@
 import pandas as pd
-import glob
+import os
+import tempfile
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import cleaning
+import dataset_io
 
 # List of relevant columns to keep
 relevant_columns = [
-    'product_name_en', 'product_name_es', 'brands', 'categories', 'quantity', 'serving_size',
+    'code', 'product_name_en', 'product_name_es', 'brands', 'categories', 'quantity', 'serving_size',
     'energy-kcal_value', 'sugars_value', 'fat_value', 'saturated-fat_value',
     'proteins_value', 'salt_value', 'fiber_value', 'ingredients_text_es'
 ]
 
-# List of all CSV files in the current directory
-csv_files = glob.glob("*.csv")
+nutrient_columns = [
+    'energy-kcal_value', 'sugars_value', 'fat_value', 'saturated-fat_value',
+    'proteins_value', 'salt_value', 'fiber_value'
+]
+# Columns added by the cleaning stage: the category, and the quantities in grams
+gram_columns = list(cleaning.gram_columns.values())
+output_columns = relevant_columns + ['macro_category'] + gram_columns
+
+output_file = dataset_io.combined_output_file
+
+# Fixed Arrow schema of the combined output, so the chunks written in streaming mode all match
+output_schema = pa.schema([(col, pa.float64() if col in nutrient_columns else pa.string()) for col in relevant_columns]
+                          + [('macro_category', pa.string())] + [(col, pa.float64()) for col in gram_columns])
+
+
+# The category name is the file name without extension (e.g. 'dfs_products/ham.csv' -> 'ham')
+def category_from_file(file):
+    return os.path.basename(file).split('.')[0]
 
-# Function to read and clean each CSV
+
+# Function to read and clean each CSV (see cleaning.py): only the relevant columns are parsed,
+# invalid rows are set apart with the reason.
+# Returns (dataframe, rejected rows, error): if the file cannot be read at all, the dataframes are
+# empty and the error is reported by the caller
 def read_and_clean_csv(file):
     try:
-        df = pd.read_csv(file, delimiter='\t', on_bad_lines='skip', low_memory=False)
-        # Select only the relevant columns if they exist in the dataframe
-        df = df[[col for col in relevant_columns if col in df.columns]]
-        # Add the macro_category column
-        df['macro_category'] = file.split('.')[0]
-        return df
+        df, malformed = cleaning.read_export(file, relevant_columns)
+        df, rejected = cleaning.clean_export(df, category_from_file(file), malformed)
+        return df[output_columns], rejected, None
     except Exception as e:
-        print(f"Error reading {file}: {e}")
-        return pd.DataFrame()  # Return empty dataframe on error
+        return pd.DataFrame(columns=output_columns), pd.DataFrame(columns=cleaning.quarantine_columns(relevant_columns)), \
+            f"{type(e).__name__}: {e}"
+
+
+# Read, clean, and combine all CSV files in memory.
+# With workers > 1 the files are parsed in a process pool; results keep the order of csv_files,
+# so the combined dataframe is the same as in the sequential run.
+# Rejected rows are added to `quarantine` (a cleaning.Quarantine) if one is given.
+# Returns the combined dataframe and a list of per-file errors.
+def combine_csv_files(csv_files, workers=1, quarantine=None):
+    if workers > 1 and len(csv_files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_and_clean_csv, csv_files))
+    else:
+        results = [read_and_clean_csv(file) for file in csv_files]
+
+    errors = [{'file': file, 'error': error} for file, (_, _, error) in zip(csv_files, results) if error]
+    if quarantine is not None:
+        for file, (df, rejected, error) in zip(csv_files, results):
+            if not error:
+                quarantine.add(category_from_file(file), len(df), rejected)
+    all_dfs = [df for df, _, error in results if not error]
+    combined_df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame(columns=output_columns)
+    return combined_df, errors
+
+
+# Appends chunks to the output file: CSV chunks are appended as text, Parquet chunks are
+# written as row groups and Feather chunks as record batches
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.format = dataset_io.dataset_format(path)
+        self.writer = None
+        self.header_written = False
+
+    def write(self, chunk):
+        if self.format == 'csv':
+            chunk.to_csv(self.path, mode='a' if self.header_written else 'w', header=not self.header_written, index=False)
+            self.header_written = True
+            return
+        table = pa.Table.from_pandas(chunk, schema=output_schema, preserve_index=False)
+        if self.writer is None:
+            if self.format == 'parquet':
+                self.writer = pq.ParquetWriter(self.path, output_schema)
+            else:
+                self.writer = pa.ipc.new_file(self.path, output_schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        elif self.format != 'csv':
+            # No chunk was written: still leave a valid, empty file behind
+            dataset_io.write_dataset(output_schema.empty_table().to_pandas(), self.path)
+        elif not self.header_written:
+            pd.DataFrame(columns=output_schema.names).to_csv(self.path, index=False)
+
+
+# Reads and cleans one export chunk by chunk into a temporary Arrow stream at spool_path.
+# Returns the kept row count and the rejected rows of each chunk
+def spool_csv_file(file, spool_path, chunksize):
+    category = category_from_file(file)
+    chunks = []
+    with pa.ipc.new_stream(spool_path, output_schema) as spool:
+        for chunk, malformed in cleaning.iter_export(file, relevant_columns, chunksize):
+            chunk, rejected = cleaning.clean_export(chunk, category, malformed)
+            spool.write_table(pa.Table.from_pandas(chunk[output_columns], schema=output_schema, preserve_index=False))
+            chunks.append((len(chunk), rejected))
+    return chunks
+
+
+# Streaming mode: read each file in chunks, clean them and append every chunk to the output file,
+# so peak memory depends on the chunk size and not on the size of the export.
+# The chunks of a file are first spooled to a temporary file and only appended once the whole file
+# is read: like in the in-memory mode, a file failing partway through leaves nothing in the output
+# or in the quarantine, and is only listed in the errors.
+# Rejected rows are added to `quarantine` (a cleaning.Quarantine) if one is given.
+# Returns the number of rows written and a list of per-file errors.
+def stream_csv_files(csv_files, output_path, chunksize=50_000, quarantine=None):
+    writer = ChunkWriter(output_path)
+    total_rows = 0
+    errors = []
+    fd, spool_path = tempfile.mkstemp(suffix='.arrows', dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    try:
+        for file in csv_files:
+            try:
+                chunks = spool_csv_file(file, spool_path, chunksize)
+            except Exception as e:
+                errors.append({'file': file, 'error': f"{type(e).__name__}: {e}"})
+                continue
+            with pa.OSFile(spool_path) as source:
+                for batch in pa.ipc.open_stream(source):
+                    writer.write(batch.to_pandas())
+            category = category_from_file(file)
+            for kept_rows, rejected in chunks:
+                total_rows += kept_rows
+                if quarantine is not None:
+                    quarantine.add(category, kept_rows, rejected)
+    finally:
+        writer.close()
+        os.remove(spool_path)
+    return total_rows, errors
+
+
+# Print the per-file errors and optionally save them as JSON
+def report_errors(errors, report_path=None):
+    for entry in errors:
+        print(f"Error reading {entry['file']}: {entry['error']}")
+    print(f"Files with errors: {len(errors)}")
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(errors, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Combine the per-category Open Food Facts exports into one dataset.')
+    parser.add_argument('--input-dir', default='.', help='Directory containing the per-category CSV files')
+    parser.add_argument('--output', default=output_file,
+                        help='Path of the combined dataset; the extension picks the format (.parquet, .feather or .csv)')
+    parser.add_argument('--streaming', action='store_true', help='Read files in chunks and append them to the output')
+    parser.add_argument('--chunksize', type=int, default=50_000, help='Rows per chunk in streaming mode')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to parse the files')
+    parser.add_argument('--error-report', help='Optional path of a JSON file listing the files that failed')
+    parser.add_argument('--quarantine', help='Path of the file receiving the rejected rows '
+                                             '(default: <output>.quarantine.tsv, with the counts in <output>.quarantine.json)')
+    args = parser.parse_args()
+
+    # List of all CSV files in the input directory (the CSV exports of the pipeline outputs are skipped)
+    csv_files = dataset_io.category_files(args.input_dir, [args.output])
 
-# Read, clean, and combine all CSV files
-all_dfs = [read_and_clean_csv(file) for file in csv_files]
-combined_df = pd.concat(all_dfs, ignore_index=True)
+    quarantine_file = args.quarantine or cleaning.quarantine_path(args.output)
+    quarantine = cleaning.Quarantine(quarantine_file, relevant_columns)
+    if args.streaming:
+        total_rows, errors = stream_csv_files(csv_files, args.output, chunksize=args.chunksize, quarantine=quarantine)
+        print(f'Combined rows written: {total_rows}')
+    else:
+        combined_df, errors = combine_csv_files(csv_files, workers=args.workers, quarantine=quarantine)
+        print(f'Combined dataframe shape: {combined_df.shape}')
+        # Save the cleaned dataframe
+        dataset_io.write_dataset(combined_df, args.output)
 
-print(f'Combined dataframe shape: {combined_df.shape}')
+    cleaning.report_quarantine(quarantine.close(), quarantine_file)
+    report_errors(errors, args.error_report)
 
+    print(f"Data extraction and preparation completed. Combined data saved to '{args.output}'.")
 
-# Save the cleaned dataframe to a new CSV file
-combined_df.to_csv('final_cleaned_breakfast_products_with_macro_category.csv', index=False)
 
-print("Data extraction and preparation completed. Combined data saved to 'final_cleaned_breakfast_products_with_macro_category.csv'.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+
+# Health score of a product:
+#
+#     sum(w * normalized beneficial nutrients) / (sum(w * normalized limited nutrients) + 1)
+#
+# Each nutrient is normalized by its maximum over the dataset. Zeros are imputed values, so they
+# are treated as missing (a product with a missing nutrient that has a weight gets no score), except
+# for calories. The score is computed in one NumPy pass over the nutrient matrix. Scoring a subset or
+# a new batch against the maxima of the full dataset gives the same scores as a full recompute.
+
+score_columns = ['energy-kcal_value', 'sugars_value', 'fat_value', 'saturated-fat_value',
+                 'proteins_value', 'salt_value', 'fiber_value']
+beneficial_columns = ['proteins_value', 'fiber_value']
+
+# Weight 0 leaves a nutrient out of the score (calories are not part of the default formula)
+default_weights = {
+    'energy-kcal_value': 0.0,
+    'sugars_value': 1.0,
+    'fat_value': 1.0,
+    'saturated-fat_value': 1.0,
+    'proteins_value': 1.0,
+    'salt_value': 1.0,
+    'fiber_value': 1.0,
+}
+
+
+# One row per nutrient (contiguous, so the reductions below stream through memory)
+def nutrient_matrix(df, columns):
+    values = np.empty((len(columns), len(df)))
+    for i, col in enumerate(columns):
+        values[i] = df[col].to_numpy(dtype=np.float64)
+        # Zeros are missing values, except for calories
+        if col != 'energy-kcal_value':
+            values[i][values[i] == 0] = np.nan
+    return values
+
+
+# Maxima used for the normalization. Partial maxima (e.g. one per category) can be combined with
+# combine_maxima
+def compute_maxima(df):
+    values = nutrient_matrix(df, score_columns)
+    with np.errstate(all='ignore'):
+        maxima = np.nanmax(values, axis=1) if values.shape[1] else np.full(len(score_columns), np.nan)
+    return {col: (None if np.isnan(value) else float(value)) for col, value in zip(score_columns, maxima)}
+
+
+def combine_maxima(maxima_list):
+    combined = {}
+    for col in score_columns:
+        values = [maxima[col] for maxima in maxima_list if maxima.get(col) is not None]
+        combined[col] = max(values) if values else None
+    return combined
+
+
+# `weights` overrides some of the default weights, e.g. {'sugars_value': 2.0}
+def resolve_weights(weights=None):
+    resolved = dict(default_weights)
+    for col, weight in (weights or {}).items():
+        if col not in resolved:
+            raise ValueError(f"Unknown health score nutrient '{col}' (expected one of {score_columns})")
+        resolved[col] = float(weight)
+    return resolved
+
+
+def health_scores(df, maxima=None, weights=None):
+    weights = resolve_weights(weights)
+    if maxima is None:
+        maxima = compute_maxima(df)
+    columns = [col for col in score_columns if weights[col] != 0]
+    maxima_vector = np.array([np.nan if maxima[col] is None else maxima[col] for col in columns])
+    weight_vector = np.array([weights[col] for col in columns])
+    beneficial = np.array([col in beneficial_columns for col in columns])
+
+    weighted = nutrient_matrix(df, columns)
+    weighted *= (weight_vector / maxima_vector)[:, None]
+    # NaN propagates through the sums: a missing nutrient gives a missing score
+    return weighted[beneficial].sum(axis=0) / (weighted[~beneficial].sum(axis=0) + 1)
+
+
+def add_health_score(df, maxima=None, weights=None):
+    return df.assign(health_score=health_scores(df, maxima, weights))
+
+
+# The maxima and weights used to score a dataset, stored next to it so that new batches can be
+# scored consistently (see rescore)
+def save_score_parameters(path, maxima, weights=None):
+    with open(path, 'w') as f:
+        json.dump({'maxima': maxima, 'weights': resolve_weights(weights)}, f, indent=2)
+
+
+def load_score_parameters(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def rescore(df, parameters_path):
+    parameters = load_score_parameters(parameters_path)
+    return add_health_score(df, parameters['maxima'], parameters['weights'])
+
+
+# Parse "--weights sugars_value=2,salt_value=1.5"
+def parse_weights(text):
+    if not text:
+        return {}
+    weights = {}
+    for part in text.split(','):
+        col, _, value = part.partition('=')
+        weights[col.strip()] = float(value)
+    return resolve_weights(weights)
+
+
+def score_parameters_path(dataset_path):
+    return f"{os.path.splitext(dataset_path)[0]}.score.json"
@@ -0,0 +1,224 @@
+import pandas as pd
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import df_combiner
+import combined_df_explorer
+import cleaning
+import dataset_io
+import dedup
+import health_score
+import normalization
+import search_index
+
+# Incremental version of df_combiner.py + combined_df_explorer.py.
+# A manifest keeps a fingerprint of every source file; each category is cached as a cleaned
+# partition and a scored partition, and only the categories whose file changed are parsed again.
+#
+# Cache layout:
+#   <cache-dir>/manifest.json
+#   <cache-dir>/cleaned/<category>.parquet
+#   <cache-dir>/scored/<category>.parquet
+#   <cache-dir>/quarantine/<category>.parquet   rows rejected by the cleaning stage
+#   <cache-dir>/duplicates/<category>.parquet   records merged by the dedup stage
+
+default_cache_dir = '.pipeline_cache'
+manifest_version = 6
+stages = ['cleaned', 'scored', 'quarantine', 'duplicates']
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Size and mtime are checked first; the file is only hashed when they differ from the manifest,
+# so touching a file without changing its content does not trigger a rebuild
+def fingerprint(path, previous=None):
+    stat = os.stat(path)
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and previous.get('size') == entry['size'] and previous.get('mtime_ns') == entry['mtime_ns']:
+        entry['sha256'] = previous['sha256']
+    else:
+        entry['sha256'] = file_sha256(path)
+    return entry
+
+
+def load_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') == manifest_version:
+            return manifest
+    return empty_manifest()
+
+
+def empty_manifest():
+    return {'version': manifest_version, 'categories': {}, 'maxima': None, 'weights': None}
+
+
+def save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def partition_path(cache_dir, stage, category):
+    return os.path.join(cache_dir, stage, f'{category}.parquet')
+
+
+# Parse, clean and deduplicate one category file (runs in a worker process).
+# Duplicates are only merged within a category, so the partitions can be deduplicated on their own
+def build_cleaned_partition(file):
+    df, rejected, error = df_combiner.read_and_clean_csv(file)
+    if error:
+        return None, None, None, error
+    df, duplicates = dedup.deduplicate(df)
+    return combined_df_explorer.clean_products(df), rejected, duplicates, None
+
+
+# Concatenate the scored partitions into the final dataset (format picked from the output extension)
+# and into the memory-mapped store read by the app
+# The normalized nutrient columns depend on the whole dataset, so they are added to the merged frame
+def merge_partitions(paths, output_path):
+    df = pd.concat([dataset_io.read_dataset(path) for path in paths], ignore_index=True)
+    scaler_parameters = normalization.fit_scaler(df)
+    df = normalization.add_normalized_columns(df, scaler_parameters)
+    for path in [output_path, dataset_io.with_format(output_path, 'arrow')]:
+        tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+        dataset_io.write_dataset(df, tmp_path)
+        os.replace(tmp_path, path)
+    normalization.save_scaler_parameters(normalization.scaler_parameters_path(output_path), scaler_parameters)
+    search_index.SearchIndex.from_frame(df).save(search_index.search_index_path(output_path))
+
+
+# Quarantine file (and counts) of the whole dataset, from the cached rejected rows of every category
+def merge_quarantine(cache_dir, categories, path):
+    quarantine = cleaning.Quarantine(path, df_combiner.relevant_columns)
+    for category in sorted(categories):
+        rejected = dataset_io.read_dataset(partition_path(cache_dir, 'quarantine', category))
+        # Rows kept by the cleaning stage, before the duplicates were merged
+        quarantine.add(category, categories[category]['rows'] + categories[category]['duplicates'], rejected)
+    return quarantine.close()
+
+
+def incremental_build(csv_files, output_path, cache_dir=default_cache_dir, workers=1, force=False, weights=None):
+    for stage in stages:
+        os.makedirs(os.path.join(cache_dir, stage), exist_ok=True)
+
+    weights = health_score.resolve_weights(weights)
+    manifest = empty_manifest() if force else load_manifest(cache_dir)
+    previous = manifest['categories']
+    files = {df_combiner.category_from_file(file): file for file in csv_files}
+
+    # Find the categories whose source file changed (or whose partitions are missing)
+    fingerprints = {}
+    changed = []
+    for category, file in files.items():
+        fingerprints[category] = fingerprint(file, previous.get(category, {}).get('source'))
+        old = previous.get(category)
+        if (old is None or old['source']['sha256'] != fingerprints[category]['sha256']
+                or not os.path.exists(partition_path(cache_dir, 'scored', category))):
+            changed.append(category)
+
+    # Drop the partitions of categories whose file was removed
+    removed = [category for category in previous if category not in files]
+    for category in removed:
+        for stage in stages:
+            if os.path.exists(partition_path(cache_dir, stage, category)):
+                os.remove(partition_path(cache_dir, stage, category))
+        del previous[category]
+
+    # Re-parse and clean only the changed categories
+    errors = []
+    if changed:
+        changed_files = [files[category] for category in changed]
+        if workers > 1 and len(changed_files) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(build_cleaned_partition, changed_files))
+        else:
+            results = [build_cleaned_partition(file) for file in changed_files]
+
+        for category, (df, rejected, duplicates, error) in zip(changed, results):
+            if error:
+                # Keep the last good partition (if any) and retry on the next run
+                errors.append({'file': files[category], 'error': error})
+                continue
+            dataset_io.write_dataset(df, partition_path(cache_dir, 'cleaned', category))
+            dataset_io.write_dataset(rejected, partition_path(cache_dir, 'quarantine', category))
+            dataset_io.write_dataset(duplicates, partition_path(cache_dir, 'duplicates', category))
+            previous[category] = {
+                'source': fingerprints[category],
+                'rows': len(df),
+                'rejected': len(rejected),
+                'duplicates': len(duplicates),
+                'maxima': health_score.compute_maxima(df),
+            }
+    failed = {df_combiner.category_from_file(entry['file']) for entry in errors}
+    for category in files:
+        if category in previous and category not in failed:
+            previous[category]['source'] = fingerprints[category]
+
+    # The health score is normalized by the maxima of the whole dataset: if they moved (or the
+    # weights changed), every category has to be rescored (from its cached cleaned partition),
+    # otherwise only the changed ones
+    maxima = health_score.combine_maxima([entry['maxima'] for entry in previous.values()])
+    if maxima != manifest['maxima'] or weights != manifest['weights']:
+        to_score = sorted(previous)
+    else:
+        to_score = sorted(category for category in changed if category in previous and category not in failed)
+
+    for category in to_score:
+        df = dataset_io.read_dataset(partition_path(cache_dir, 'cleaned', category))
+        df = health_score.add_health_score(df, maxima, weights)
+        dataset_io.write_dataset(df, partition_path(cache_dir, 'scored', category))
+
+    manifest['maxima'] = maxima
+    manifest['weights'] = weights
+    manifest['categories'] = previous
+    save_manifest(cache_dir, manifest)
+
+    merge_partitions([partition_path(cache_dir, 'scored', category) for category in sorted(previous)], output_path)
+    health_score.save_score_parameters(health_score.score_parameters_path(output_path), maxima, weights)
+    quarantine = merge_quarantine(cache_dir, previous, cleaning.quarantine_path(output_path))
+    dedup.save_duplicates([dataset_io.read_dataset(partition_path(cache_dir, 'duplicates', category))
+                           for category in sorted(previous)], dedup.duplicates_path(output_path))
+    return {'changed': changed, 'removed': removed, 'rescored': to_score, 'errors': errors, 'quarantine': quarantine,
+            'duplicates': sum(entry['duplicates'] for entry in previous.values()),
+            'rows': sum(entry['rows'] for entry in previous.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the preprocessed dataset, re-parsing only the categories that changed.')
+    parser.add_argument('--input-dir', default='.', help='Directory containing the per-category CSV files')
+    parser.add_argument('--output', default=combined_df_explorer.output_file,
+                        help='Path of the preprocessed dataset; the extension picks the format (.parquet, .feather or .csv)')
+    parser.add_argument('--cache-dir', default=default_cache_dir, help='Directory holding the manifest and the cached partitions')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to parse the changed files')
+    parser.add_argument('--force', action='store_true', help='Ignore the manifest and rebuild every category')
+    parser.add_argument('--weights', default='',
+                        help='Health score weights to override, e.g. sugars_value=2,energy-kcal_value=0.5')
+    args = parser.parse_args()
+
+    # Skip the CSV exports of the pipeline outputs that may live next to the category files
+    csv_files = dataset_io.category_files(args.input_dir, [args.output])
+
+    summary = incremental_build(csv_files, args.output, cache_dir=args.cache_dir, workers=args.workers, force=args.force,
+                                 weights=health_score.parse_weights(args.weights))
+    print(f"Changed categories: {len(summary['changed'])}, removed: {len(summary['removed'])}, rescored: {len(summary['rescored'])}")
+    cleaning.report_quarantine(summary['quarantine'], cleaning.quarantine_path(args.output))
+    dedup.report_duplicates(summary['duplicates'], summary['rows'], dedup.duplicates_path(args.output))
+    df_combiner.report_errors(summary['errors'])
+    print(f"Incremental build completed. Data saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import json
+import os
+import numpy as np
+
+# Min-max normalization of the nutrient columns, computed once by the pipeline instead of
+# fitting sklearn's MinMaxScaler every time the app starts.
+# The dataset keeps the raw per-100g values and gets a normalized_<column> copy of each
+# nutrient, in [0, 1]. The parameters (minimum and maximum of every column) are saved next to
+# the dataset, so that new rows can be normalized the same way.
+
+nutrient_columns = ['sugars_value', 'fat_value', 'energy-kcal_value', 'fiber_value', 'proteins_value', 'salt_value']
+normalized_columns = [f'normalized_{col}' for col in nutrient_columns]
+
+
+# {column: {'min': ..., 'max': ...}}, NaNs are ignored (like MinMaxScaler)
+def fit_scaler(df):
+    parameters = {}
+    for col in nutrient_columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        with np.errstate(all='ignore'):
+            low, high = (np.nanmin(values), np.nanmax(values)) if len(values) else (np.nan, np.nan)
+        parameters[col] = {'min': None if np.isnan(low) else float(low),
+                           'max': None if np.isnan(high) else float(high)}
+    return parameters
+
+
+# Same result as MinMaxScaler().fit_transform: a constant column becomes 0
+def add_normalized_columns(df, parameters=None):
+    if parameters is None:
+        parameters = fit_scaler(df)
+    normalized = {}
+    for col, normalized_col in zip(nutrient_columns, normalized_columns):
+        low = np.nan if parameters[col]['min'] is None else parameters[col]['min']
+        high = np.nan if parameters[col]['max'] is None else parameters[col]['max']
+        value_range = high - low if high != low else 1.0
+        normalized[normalized_col] = (df[col].to_numpy(dtype=np.float64) - low) / value_range
+    return df.assign(**normalized)
+
+
+def save_scaler_parameters(path, parameters):
+    with open(path, 'w') as f:
+        json.dump(parameters, f, indent=2)
+
+
+def load_scaler_parameters(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def scaler_parameters_path(dataset_path):
+    return f"{os.path.splitext(dataset_path)[0]}.scaler.json"
@@ -0,0 +1,161 @@
+import os
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+
+# Full-text product search: an inverted index over the product names, brands, categories
+# and ingredients, built by the pipeline and saved next to the dataset (<dataset>.search.npz).
+#
+# Texts are lowercased and accent-folded ("Jamón" -> "jamon"). The vocabulary is sorted, so
+# every term starting with a prefix is a contiguous range of it, and so are their postings:
+# the last word of a query is matched as a prefix (typeahead), the other words exactly, and
+# a product must match every word. Products are ranked by the sum over the query words of
+#   idf(word) * sum of the weights of the fields containing the matched term
+# where idf(word) = log(1 + products / products matching the word). A prefix match counts for
+# len(prefix) / len(term), so "jamon" ranks "jamon" before "jamoncete".
+
+# Field weights: a word in the product name counts more than one in the ingredients
+search_fields = {'product_name_es': 3.0, 'brands': 2.0, 'categories': 1.0, 'ingredients_text_es': 0.5}
+stopwords = {'de', 'del', 'la', 'el', 'los', 'las', 'con', 'sin', 'para', 'y', 'en', 'al', 'un', 'una', 'o',
+             'e', 'a', 'unknown'}
+# Longer tokens are noise (URLs, glued words) and would widen the vocabulary array
+max_term_length = 30
+
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', fold(text))
+
+
+def index_terms(text):
+    return {token for token in tokenize(text) if token not in stopwords and len(token) <= max_term_length}
+
+
+class SearchIndex:
+    # terms: sorted vocabulary; postings of terms[i] are rows/weights[offsets[i]:offsets[i + 1]],
+    # sorted by row, with the sum of the weights of the fields of the row containing the term
+    def __init__(self, terms, offsets, rows, weights, n_rows):
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.n_rows = int(n_rows)
+        self.term_lengths = np.char.str_len(terms) if len(terms) else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.n_rows
+
+    @classmethod
+    def from_frame(cls, df, fields=search_fields):
+        n_rows = len(df)
+        vocabulary = {}
+        field_terms = []
+        # Many rows share the same texts (brands, categories), so each distinct text is tokenized once
+        for field, weight in fields.items():
+            if field not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[field])
+            text_offsets = [0]
+            text_terms = []
+            for text in uniques:
+                text_terms.extend(vocabulary.setdefault(term, len(vocabulary)) for term in index_terms(text))
+                text_offsets.append(len(text_terms))
+            field_terms.append((weight, codes, np.array(text_offsets, dtype=np.int64), np.array(text_terms, dtype=np.int64)))
+
+        terms = np.array(sorted(vocabulary), dtype=str)
+        # Term ids in the order of the sorted vocabulary
+        rank = np.empty(len(vocabulary), dtype=np.int64)
+        rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+        keys, weights = [], []
+        for weight, codes, text_offsets, text_terms in field_terms:
+            rows = np.flatnonzero(codes >= 0)
+            counts = np.diff(text_offsets)[codes[rows]]
+            # (row, term) pairs of the field: the terms of the text of every row
+            starts = np.repeat(text_offsets[codes[rows]] - np.cumsum(counts) + counts, counts)
+            pair_terms = rank[text_terms[starts + np.arange(counts.sum())]]
+            keys.append(pair_terms * n_rows + np.repeat(rows, counts))
+            weights.append(np.full(len(pair_terms), weight))
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        field_weights = np.bincount(inverse, weights=np.concatenate(weights) if weights else None)
+
+        posting_terms, rows = np.divmod(keys, max(n_rows, 1))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(posting_terms, minlength=len(terms)))])
+        return cls(terms, offsets, rows.astype(np.int32), field_weights.astype(np.float32), n_rows)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, terms=self.terms, offsets=self.offsets, rows=self.rows, weights=self.weights,
+                 n_rows=self.n_rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'], data['offsets'], data['rows'], data['weights'], data['n_rows'])
+
+    # Score of every row for a query word (0 if the row does not match), as a dense array
+    def word_scores(self, token, prefix):
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        start = np.searchsorted(self.terms, token, side='left')
+        end = np.searchsorted(self.terms, token + '\uffff', side='left') if prefix else start + (
+            start < len(self.terms) and self.terms[start] == token)
+        if start == end:
+            return scores
+        rows = self.rows[self.offsets[start]:self.offsets[end]]
+        weights = self.weights[self.offsets[start]:self.offsets[end]]
+        if end - start == 1:
+            scores[rows] = weights
+        else:
+            # Completions of the prefix: shorter completions rank higher, and a row matching several
+            # of them keeps its best one
+            weights = weights * np.repeat((len(token) / self.term_lengths[start:end]).astype(np.float32),
+                                          np.diff(self.offsets[start:end + 1]))
+            np.maximum.at(scores, rows, weights)
+        scores *= np.log1p(self.n_rows / np.count_nonzero(scores))
+        return scores
+
+    # Positions of the best matching rows, best first. `positions` restricts the search to
+    # some rows (e.g. a category)
+    def search(self, query, k=50, positions=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        # The last word is still being typed, unless the query ends with a space: then it is a
+        # whole word, and dropped like the others if it is a stopword ("leche de ")
+        last_is_prefix = not query[-1].isspace()
+        words = [(token, False) for token in tokens[:-1] if token not in stopwords]
+        if last_is_prefix or tokens[-1] not in stopwords:
+            words.append((tokens[-1], last_is_prefix))
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+
+        # Rows matching every word (all the weights are positive)
+        totals = np.zeros(self.n_rows, dtype=np.float32)
+        matched = np.ones(self.n_rows, dtype=bool)
+        if positions is not None:
+            matched[:] = False
+            matched[positions] = True
+        for token, prefix in words:
+            scores = self.word_scores(token, prefix)
+            matched &= scores > 0
+            totals += scores
+
+        rows = np.flatnonzero(matched)
+        totals = totals[rows]
+        if len(rows) > k:
+            best = np.argpartition(-totals, k - 1)[:k]
+            rows, totals = rows[best], totals[best]
+        # Ties keep the dataset order
+        order = np.lexsort((rows, -totals))
+        return rows[order]
+
+
+def search_index_path(dataset_path):
+    return f"{os.path.splitext(dataset_path)[0]}.search.npz"
@@ -0,0 +1,134 @@
+# Category -> brand -> product index for the dropdown callbacks of app.py.
+# The category and brand options, and the row positions of every category/brand, are built once
+# when the app loads, so a callback only does a dict lookup instead of filtering the whole frame.
+# Values keep their order of first appearance in the dataset, like Series.unique().
+# Product options are built on demand from the row positions, for the few products a dropdown
+# shows: one option dict per product, held for every selection, would cost about a gigabyte per
+# worker at a million rows. They have the product key as value, so two products with the same
+# name stay two distinct choices; their label adds the brand to the name.
+
+
+import functools
+
+import numpy as np
+
+
+def to_options(values):
+    return [{'label': value, 'value': value} for value in values]
+
+
+def grouped_options(df, keys, column):
+    groups = df.groupby(keys, observed=True, sort=False)[column].unique()
+    return {key: to_options(values) for key, values in groups.items()}
+
+
+# Key of every product: "<code>|<macro_category>". A code alone is not unique: the pipeline merges
+# duplicates within a category, and the same product can be listed in two (peanut butter in nuts
+# and peanut_butter)
+def product_keys(df):
+    return df['code'].astype(str).to_numpy(dtype=object) + '|' + df['macro_category'].astype(str).to_numpy(dtype=object)
+
+
+def product_key(code, category):
+    return f'{code}|{category}'
+
+
+# Dropdown labels of the products: the name, followed by the brand when it is known
+def product_labels(df):
+    names = df['product_name_es'].astype(str).to_numpy(dtype=object)
+    brands = df['brands'].astype(str).to_numpy(dtype=object)
+    known = df['brands'].notna().to_numpy() & (brands != 'Unknown')
+    return np.where(known, names + ' (' + brands + ')', names)
+
+
+# Product options of the rows at `positions`, one per product key (its first row), at most `limit`.
+# Only the first rows are read; more are read if some of them are duplicates
+def product_options(df, positions, limit=None):
+    positions = np.asarray(positions)
+    count = len(positions) if limit is None else limit
+    while True:
+        rows = df.iloc[positions[:count]]
+        keys = product_keys(rows)
+        _, first = np.unique(keys, return_index=True)
+        if limit is None or len(first) >= limit or count >= len(positions):
+            break
+        count *= 2
+    first = np.sort(first)[:limit]
+    return [{'label': label, 'value': key} for label, key in zip(product_labels(rows.iloc[first]), keys[first])]
+
+
+class ProductIndex:
+    def __init__(self, df):
+        self.category_options = to_options(df['macro_category'].unique())
+        self.brands_by_category = grouped_options(df, 'macro_category', 'brands')
+        self.df = df
+
+        # Row positions of each category/brand, in dataset order
+        self.all_rows = np.arange(len(df))
+        self.rows_by_category = df.groupby('macro_category', observed=True, sort=False).indices
+        self.rows_by_brand = df.groupby('brands', observed=True, sort=False).indices
+        self.rows_by_category_brand = df.groupby(['macro_category', 'brands'], observed=True, sort=False).indices
+
+    def brand_options(self, category):
+        return self.brands_by_category.get(category, [])
+
+    # Product options for the selected category and/or brand (all products if neither is selected),
+    # at most `limit`
+    def product_options(self, category=None, brand=None, limit=None):
+        return product_options(self.df, self.row_positions(category, brand), limit)
+
+    # Row positions for the selected category and/or brand (all rows if neither is selected)
+    def row_positions(self, category=None, brand=None):
+        empty = self.all_rows[:0]
+        if category and brand:
+            return self.rows_by_category_brand.get((category, brand), empty)
+        if category:
+            return self.rows_by_category.get(category, empty)
+        if brand:
+            return self.rows_by_brand.get(brand, empty)
+        return self.all_rows
+
+
+# Point lookups of a single product (row position in the frame), replacing full-table scans
+# like df[df['product_name_es'] == name].iloc[0].
+# Products are keyed by their Open Food Facts barcode ('code') and macro category, the values of
+# the product dropdowns (see product_keys). A code alone resolves to its first row, whatever the
+# category. Names are not unique (the pipeline merges the duplicate records of a product, but
+# different products can share a name): a name resolves to its first row in the dataset.
+class ProductLookup:
+    def __init__(self, df):
+        self.df = df
+        keys = product_keys(df)
+        self.position_by_key = dict(zip(keys.tolist(), range(len(keys))))
+
+    # The code and name tables are only built if they are used (the dropdowns and the scatter
+    # resolve by key), as each holds a string per row in every worker
+    @functools.cached_property
+    def position_by_code(self):
+        return first_positions(self.df['code'])
+
+    @functools.cached_property
+    def position_by_name(self):
+        return first_positions(self.df['product_name_es'])
+
+    def by_key(self, key):
+        return self.position_by_key.get(key)
+
+    def by_code(self, code):
+        return self.position_by_code.get(code)
+
+    def by_name(self, name):
+        return self.position_by_name.get(name)
+
+    # Resolve by key (code and category) when there is one, then by code, otherwise by name
+    def resolve(self, code=None, name=None, category=None):
+        position = self.by_key(product_key(code, category)) if code and category else None
+        if position is None and code:
+            position = self.by_code(code)
+        return position if position is not None else self.by_name(name)
+
+
+# {value: position of its first row}, skipping missing values
+def first_positions(series):
+    first = series.reset_index(drop=True).dropna().drop_duplicates(keep='first')
+    return dict(zip(first.tolist(), first.index.tolist()))
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pre_processing.dataset_io import read_dataset, find_dataset, with_format
+
+# Read-only product store backed by a memory-mapped Arrow IPC file (written next to the
+# Parquet dataset by the preprocessing pipeline).
+# The file is mapped, not parsed: opening it is near-instant, and every process that opens it
+# (e.g. each gunicorn worker) shares the same pages through the OS page cache instead of
+# holding its own copy. The pipeline replaces the file atomically, so running workers keep
+# reading the old version until they are restarted.
+
+
+class ProductStore:
+    def __init__(self, table, path=None, mapped=False):
+        self.table = table
+        self.path = path
+        # Whether the columns are views of a memory-mapped file (shared between the processes)
+        self.mapped = mapped
+        # Identifies the dataset file that was opened (size and modification time), e.g. to
+        # invalidate caches when the pipeline rebuilds it
+        self.version = file_version(path)
+
+    # Map the Arrow file without copying it
+    @classmethod
+    def open(cls, path):
+        source = pa.memory_map(path, 'r')
+        return cls(pa.ipc.open_file(source).read_all(), path, mapped=True)
+
+    # In-memory fallback for datasets that only exist as Parquet/Feather/CSV
+    @classmethod
+    def from_frame(cls, df, path=None):
+        return cls(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    # Pandas view of the selected columns. split_blocks keeps one block per column, so numeric
+    # columns without nulls stay zero-copy views of the mapped file
+    def frame(self, columns=None):
+        table = self.table.select(columns) if columns else self.table
+        return table.to_pandas(split_blocks=True)
+
+    # Materialize only the given rows (by position); the index of the result is the row position
+    def rows(self, positions, columns=None):
+        positions = np.asarray(positions, dtype=np.int64)
+        table = self.table.select(columns) if columns else self.table
+        df = decode_small_dictionaries(table.take(pa.array(positions))).to_pandas()
+        df.index = pd.Index(positions)
+        return df
+
+
+# take() keeps the whole dictionary of the dictionary-encoded columns, which to_pandas turns into
+# the categories of the result: for fewer rows than distinct values (a table page, one product)
+# decoding the values is much cheaper
+def decode_small_dictionaries(table):
+    for i, column in enumerate(table.columns):
+        if pa.types.is_dictionary(column.type) and column.num_chunks:
+            if len(column) < sum(len(chunk.dictionary) for chunk in column.chunks):
+                table = table.set_column(i, table.field(i).name, column.cast(column.type.value_type))
+    return table
+
+
+def file_version(path):
+    if path is None or not os.path.exists(path):
+        return ''
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+# Open the store for a dataset path (any extension): the memory-mapped .arrow file if it exists,
+# otherwise the dataset is loaded into memory from Parquet/Feather/CSV
+def open_store(path):
+    store_path = with_format(path, 'arrow')
+    if os.path.exists(store_path):
+        return ProductStore.open(store_path)
+    fallback = find_dataset(path)
+    return ProductStore.from_frame(read_dataset(fallback), fallback)
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Per-category recommendations of the Query Section.
+# For every category, the three candidates (lowest sugar, fat and calories among the products
+# with all three values above zero) are precomputed once. The LLM decisions for the categories
+# run concurrently, bounded by max_concurrency and a per-category timeout; categories that fail
+# or time out get a short note and the others are still returned, in the order asked.
+
+candidate_columns = ['sugars_value', 'fat_value', 'energy-kcal_value']
+
+
+# {category: [position of lowest sugar, lowest fat, lowest calories]}.
+# idxmin returns the first row with the minimum, like nsmallest(1)
+def category_minima(df):
+    eligible = df[(df['sugars_value'] > 0) & (df['fat_value'] > 0) & (df['energy-kcal_value'] > 0)]
+    groups = eligible.groupby('macro_category', observed=True)
+    lowest = {col: groups[col].idxmin() for col in candidate_columns}
+    return {category: [int(lowest[col][category]) for col in candidate_columns]
+            for category in lowest[candidate_columns[0]].index}
+
+
+def decision_prompt(category, user_query, options):
+    lowest_sugar, lowest_fat, lowest_calories = options
+    return (
+        f"We need you to decide for the category '{category}' which one is the healthiest product since our user wants this '{user_query}'. "
+        f"Those are the products you have to choose from:\n"
+        f"Product 1:\n{lowest_sugar}\n\n"
+        f"Product 2:\n{lowest_fat}\n\n"
+        f"Product 3:\n{lowest_calories}\n\n"
+        f"Please be synthetic and provide the name of the product for each category that you think is the healthiest and a couple of motivations for why."
+    )
+
+
+def format_recommendation(category, response_text):
+    # Format the title and motivations
+    title = f"### Healthiest Options - {category.capitalize()}"
+    lines = response_text.split("**Motivations:**")
+    description = lines[0].replace("###", "").strip()
+    motivations = lines[1].strip() if len(lines) > 1 else ""
+
+    # Combine parts
+    return f"{title}\n\n{description}\n\n**Motivations:**\n{motivations}\n\n"
+
+
+class RecommendationEngine:
+    # llm: CachedChatClient; minima: output of category_minima; product_record: position -> dict;
+    # llm_timer: context manager factory timing the wait for each LLM call (e.g. CallbackMetrics.llm_time)
+    def __init__(self, llm, minima, product_record, max_concurrency=4, timeout=60, llm_timer=contextlib.nullcontext):
+        self.llm = llm
+        self.minima = minima
+        self.product_record = product_record
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.llm_timer = llm_timer
+        # The client is blocking, so the calls run in threads. The pool belongs to the engine (not to
+        # the event loop), so a call that timed out does not hold up the response while it finishes;
+        # it is larger than max_concurrency so such calls do not starve the next requests
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency * 4, thread_name_prefix='recommendations')
+
+    async def recommend_category(self, category, user_query, semaphore):
+        options = [self.product_record(position) for position in self.minima[category]]
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant that provides nutritional recommendations."},
+            {"role": "user", "content": decision_prompt(category, user_query, options)}
+        ]
+        async with semaphore:
+            call = asyncio.get_running_loop().run_in_executor(self.executor, self.llm.complete, "gpt-4o", messages)
+            with self.llm_timer():
+                response_text = await asyncio.wait_for(call, self.timeout)
+        return format_recommendation(category, response_text)
+
+    async def recommend_async(self, categories, user_query):
+        # Categories without eligible products are skipped
+        categories = [category for category in dict.fromkeys(categories) if category in self.minima]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*[self.recommend_category(category, user_query, semaphore) for category in categories],
+                                       return_exceptions=True)
+        recommendations = ""
+        for category, result in zip(categories, results):
+            if isinstance(result, asyncio.TimeoutError):
+                recommendations += f"### Healthiest Options - {category.capitalize()}\n\n_No recommendation: the request timed out._\n\n"
+            elif isinstance(result, Exception):
+                recommendations += f"### Healthiest Options - {category.capitalize()}\n\n_No recommendation: {type(result).__name__}._\n\n"
+            else:
+                recommendations += result
+        return recommendations
+
+    # Entry point for the (synchronous) Dash callbacks
+    def recommend(self, categories, user_query):
+        return asyncio.run(self.recommend_async(categories, user_query))
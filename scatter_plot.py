@@ -0,0 +1,43 @@
+import math
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Sugar vs fat scatter of app.py, drawn with WebGL (Scattergl).
+# Above max_points the points are binned on the server: the plane is cut into a grid, and each
+# occupied cell of each category is drawn as one real product of that cell (its first row), with
+# the number of products in the cell in the hover. The grid is sized so that all the categories
+# together draw at most max_points. Clicking a point still opens a product.
+
+default_max_points = 5000
+
+
+def bin_index(values, bins):
+    low, high = np.nanmin(values), np.nanmax(values)
+    if high <= low:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.clip(((values - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+
+
+# One representative row per (category, grid cell), with the size of the cell in 'points_in_bin'
+def bin_points(df, x, y, bins):
+    df = df.dropna(subset=[x, y])
+    cells = bin_index(df[x].to_numpy(dtype=float), bins) * bins + bin_index(df[y].to_numpy(dtype=float), bins)
+    groups = df.groupby([df['macro_category'], pd.Series(cells, index=df.index)], observed=True, sort=False)
+    sizes = groups[x].transform('size')
+    representatives = groups.head(1).index
+    return df.loc[representatives].assign(points_in_bin=sizes.loc[representatives])
+
+
+def build_scatter_figure(df, x='sugars_value', y='fat_value', max_points=default_max_points):
+    title = 'Sugar vs Fat Content (Normalized)'
+    hover_data = {'product_name_es': True, x: True, y: True, 'macro_category': True}
+    if len(df) > max_points:
+        # The cells are per category: the max_points budget is split between the categories drawn
+        categories = max(1, df['macro_category'].nunique())
+        df = bin_points(df, x, y, bins=max(1, int(math.sqrt(max_points / categories))))
+        hover_data['points_in_bin'] = True
+        title += f' - binned, 1 point per cell ({len(df)} points)'
+    # customdata starts with [code, product_name_es, macro_category]: handle_query_and_click relies on it
+    return px.scatter(df, x=x, y=y, color='macro_category', title=title, render_mode='webgl',
+                      custom_data=['code', 'product_name_es', 'macro_category'], hover_data=hover_data)
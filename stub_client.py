@@ -0,0 +1,28 @@
+import time
+from types import SimpleNamespace
+
+# Local stand-in for openai.OpenAI, for running the app and the benchmarks without the API.
+# `responder(model, messages)` returns the text of the answer; `latency` simulates the round-trip.
+# Set LLM_STUB=1 to make app.py use it.
+
+
+def default_responder(model, messages):
+    prompt = messages[-1]['content']
+    if 'extract' in messages[0]['content']:
+        return "['milk']"
+    return f"**Stub answer** ({model}) to a prompt of {len(prompt)} characters.\n\n**Motivations:**\n- Local stub client"
+
+
+class StubChatClient:
+    def __init__(self, responder=default_responder, latency=0.0):
+        self.responder = responder
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.responder(model, messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -0,0 +1,84 @@
+# Backend filtering and sorting for DataTables with filter_action/sort_action='custom'.
+# filter_query uses the DataTable filter syntax, e.g. "{sugars_value} < 0.2 && {brands} contains Hacendado";
+# the parsing follows the example in the Dash documentation (https://dash.plotly.com/datatable/callbacks).
+
+operators = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+
+# Split one clause of the filter query into (column, operator, value)
+def split_filter_part(filter_part):
+    for operator_type in operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 == value_part[-1:] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+
+def parse_filter_query(filter_query):
+    if not filter_query:
+        return []
+    clauses = [split_filter_part(part) for part in filter_query.split(' && ')]
+    return [clause for clause in clauses if clause[0]]
+
+
+# Columns needed to evaluate the filter and the sort
+def query_columns(filter_query, sort_by):
+    columns = [col_name for col_name, _, _ in parse_filter_query(filter_query)]
+    columns += [col['column_id'] for col in (sort_by or [])]
+    return list(dict.fromkeys(columns))
+
+
+def apply_filter(df, filter_query):
+    for col_name, operator, filter_value in parse_filter_query(filter_query):
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            # Numbers typed in a text column are compared as text
+            if isinstance(filter_value, float) and column.dtype.kind not in 'if':
+                filter_value = str(int(filter_value)) if filter_value.is_integer() else str(filter_value)
+            comparisons = {'eq': column.__eq__, 'ne': column.__ne__, 'lt': column.__lt__,
+                           'le': column.__le__, 'gt': column.__gt__, 'ge': column.__ge__}
+            try:
+                df = df.loc[comparisons[operator](filter_value)]
+            except TypeError:
+                # e.g. "<" on a categorical column: nothing can match
+                df = df.iloc[0:0]
+        elif operator == 'contains':
+            df = df.loc[column.astype(str).str.contains(str(filter_value), case=False, regex=False, na=False)]
+        elif operator == 'datestartswith':
+            df = df.loc[column.astype(str).str.startswith(str(filter_value), na=False)]
+    return df
+
+
+def apply_sort(df, sort_by):
+    if not sort_by:
+        return df
+    columns = [col['column_id'] for col in sort_by if col['column_id'] in df.columns]
+    ascending = [col['direction'] == 'asc' for col in sort_by if col['column_id'] in df.columns]
+    if not columns:
+        return df
+    return df.sort_values(columns, ascending=ascending, kind='mergesort')
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from category_extractor import CategoryExtractor
+
+
+# Words specific to a category are learned from the distinct texts, counting each row once
+def test_from_frame_learns_category_words():
+    df = pd.DataFrame({
+        'macro_category': ['ham'] * 4 + ['yogurt'] * 4,
+        'product_name_es': ['Paleta ibérica', 'Paleta ibérica', 'Jamón cocido', None,
+                            'Yogur griego', 'Yogur griego', 'Kéfir natural', 'Yogur paleta'],
+        'categories': ['Embutidos, Paletas', 'Embutidos', 'Embutidos', 'Embutidos',
+                       'Lácteos', 'Lácteos', 'Lácteos, Kéfir', 'Lácteos'],
+    }).astype({'macro_category': 'category', 'categories': 'category'})
+    extractor = CategoryExtractor.from_frame(df)
+
+    assert extractor.terms[('embutido',)] == ('ham', 1.0)
+    # 'paleta' is in 3 rows (once in both columns of a row): 2 of them are ham
+    assert extractor.terms[('paleta',)] == ('ham', 2 / 3)
+    # 'kefir' (accent folded) is in 1 of the 4 yogurt rows: support 0.25
+    assert extractor.terms[('kefir',)] == ('yogurt', 1.0)
+    assert extractor.extract('quiero embutidos') == (['ham'], True)
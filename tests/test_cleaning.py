@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import cleaning
+
+columns = ['code', 'product_name_es', 'quantity', 'energy-kcal_value', 'sugars_value', 'salt_value']
+
+
+def read(tmp_path, lines):
+    path = tmp_path / 'ham.csv'
+    path.write_text('\n'.join(['\t'.join(columns)] + ['\t'.join(line) for line in lines]) + '\n')
+    return cleaning.read_export(str(path), columns)
+
+
+# Every row failing a check is quarantined with the first failed check as reason
+def test_clean_export_quarantines_invalid_rows_with_the_reason(tmp_path):
+    df, malformed = read(tmp_path, [
+        ('8410000000001', 'Jamón cocido', '2 x 100 g', '110', '1,5', '2'),
+        ('8410000000002', '', '200 g', '120', '1', '2'),
+        ('', 'Jamón serrano', '100 g', '250', '0', '5'),
+        ('84A0000000004', 'Jamón ibérico', '80 g', '300', '0', '4'),
+        ('8410000000005', 'Paleta', '100 g', 'abc', '0', '3'),
+        ('8410000000006', 'Lacón', '150 g', '140', '0', '1392'),
+        ('8410000000007', 'Pechuga', '1 kg', '100', '', ''),
+        ('8410000000008', 'too', 'few fields'),
+    ])
+    valid, rejected = cleaning.clean_export(df, 'ham', malformed)
+
+    assert valid['code'].tolist() == ['8410000000001', '8410000000007']
+    assert valid['macro_category'].tolist() == ['ham', 'ham']
+    # Decimal commas are parsed, and missing nutrients stay missing (imputed later)
+    assert valid['sugars_value'].tolist()[0] == 1.5 and np.isnan(valid['sugars_value'].tolist()[1])
+    assert valid['quantity_g'].tolist() == [200.0, 1000.0]
+    assert rejected['reason'].tolist() == ['missing_name', 'missing_code', 'invalid_code', 'invalid_nutrient',
+                                           'nutrient_out_of_range', 'malformed_line']
+    assert rejected['detail'].tolist()[3:5] == ['energy-kcal_value=abc', 'salt_value=1392']
+    assert set(rejected['macro_category']) == {'ham'}
+
+
+# The quarantine counts the kept rows and the rejected rows per category and reason
+def test_quarantine_counts_per_category_and_reason(tmp_path):
+    df, malformed = read(tmp_path, [
+        ('8410000000001', 'Jamón cocido', '100 g', '110', '1', '2'),
+        ('8410000000002', '', '200 g', '120', '1', '2'),
+        ('8410000000003', 'Lacón', '150 g', '140', '120', '1'),
+    ])
+    quarantine = cleaning.Quarantine(str(tmp_path / 'quarantine.tsv'), columns)
+    valid, rejected = cleaning.clean_export(df, 'ham', malformed)
+    quarantine.add('ham', len(valid), rejected)
+    summary = quarantine.close()
+
+    assert summary['rows_read'] == 3 and summary['rows_kept'] == 1
+    assert summary['reasons'] == {'missing_name': 1, 'nutrient_out_of_range': 1}
+    assert summary['categories'] == {'ham': {'kept': 1, 'rejected': {'missing_name': 1, 'nutrient_out_of_range': 1}}}
+    assert (tmp_path / 'quarantine.json').exists()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import dataset_io
+
+
+# The CSV exports of the pipeline outputs written next to the category files are not categories
+def test_category_files_skip_the_pipeline_exports(tmp_path):
+    names = ['ham.csv', 'yogurt.csv', 'custom.csv', 'ham.tsv',
+             dataset_io.with_format(dataset_io.combined_output_file, 'csv'),
+             dataset_io.with_format(dataset_io.preprocessed_output_file, 'csv')]
+    for name in names:
+        (tmp_path / name).write_text('code\n')
+    files = dataset_io.category_files(str(tmp_path), [str(tmp_path / 'custom.parquet')])
+    assert [os.path.basename(f) for f in files] == ['ham.csv', 'yogurt.csv']
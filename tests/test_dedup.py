@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import dedup
+
+
+def products(rows):
+    df = pd.DataFrame(rows, columns=['code', 'product_name_es', 'brands', 'macro_category', 'energy-kcal_value',
+                                     'fat_value'])
+    return df.astype({'code': 'str', 'product_name_es': 'str', 'brands': 'str', 'macro_category': 'category'})
+
+
+# Same brand and name but conflicting nutrients: two different products, kept apart
+def test_same_name_with_conflicting_nutrients_is_not_merged():
+    df = products([
+        ['8436019097106', 'Bebida de almendras', 'Soymilk', 'almond_milk', 40.0, 1.1],
+        ['08482488', 'Bebida de almendras', 'Soymilk', 'almond_milk', 225.0, 12.0],
+    ])
+    result, report = dedup.deduplicate(df)
+    assert len(result) == 2
+    assert result['energy-kcal_value'].tolist() == [40.0, 225.0]
+    assert report.empty
+
+
+# Same name with compatible nutrients: merged, with the median of the values
+def test_same_name_with_compatible_nutrients_is_merged():
+    df = products([
+        ['8480000603296', 'Jamón cocido', 'Hacendado', 'ham', 100.0, 3.0],
+        ['8480000603297', 'JAMON COCIDO', 'Hacendado', 'ham', 104.0, 3.2],
+    ])
+    result, report = dedup.deduplicate(df)
+    assert len(result) == 1
+    assert result['energy-kcal_value'].iloc[0] == 102.0
+    assert report['duplicate_code'].tolist() == ['8480000603297']
+
+
+# A code listed twice with conflicting values: merged, keeping the values of the most complete record
+def test_conflicting_group_keeps_most_complete_record():
+    df = products([
+        ['8424660505309', 'Jamón cocido', 'Urkabe', 'ham', 377.0, np.nan],
+        ['8424660505309', 'Jamón cocido', 'Urkabe', 'ham', 90.0, 2.7],
+    ])
+    result, _ = dedup.deduplicate(df)
+    assert len(result) == 1
+    assert result[['energy-kcal_value', 'fat_value']].iloc[0].tolist() == [90.0, 2.7]
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import cleaning
+import df_combiner
+
+
+def write_export(path, names):
+    rows = [{'code': f'84100000000{i}', 'product_name_es': name, 'brands': 'Hacendado', 'energy-kcal_value': '100'}
+            for i, name in enumerate(names)]
+    pd.DataFrame(rows, columns=df_combiner.relevant_columns).to_csv(path, sep='\t', index=False)
+
+
+# A file failing after its first chunk leaves nothing in the output or in the quarantine
+def test_stream_drops_a_file_failing_partway(tmp_path, monkeypatch):
+    write_export(tmp_path / 'ham.csv', ['Jamón cocido', 'Jamón serrano'])
+    write_export(tmp_path / 'yogurt.csv', ['Yogur natural', 'Yogur griego'])
+    iter_export = cleaning.iter_export
+
+    def failing_iter_export(path, columns, chunksize):
+        for chunk, malformed in iter_export(path, columns, chunksize):
+            yield chunk, malformed
+            if path.endswith('yogurt.csv'):
+                raise OSError('read error')
+
+    monkeypatch.setattr(cleaning, 'iter_export', failing_iter_export)
+    output = str(tmp_path / 'combined.csv')
+    quarantine = cleaning.Quarantine(str(tmp_path / 'quarantine.tsv'), df_combiner.relevant_columns)
+    files = [str(tmp_path / 'ham.csv'), str(tmp_path / 'yogurt.csv')]
+    total_rows, errors = df_combiner.stream_csv_files(files, output, quarantine=quarantine)
+
+    assert total_rows == 2
+    assert [entry['file'] for entry in errors] == [files[1]]
+    assert pd.read_csv(output)['macro_category'].tolist() == ['ham', 'ham']
+    assert list(quarantine.summary()['categories']) == ['ham']
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.arrows')]
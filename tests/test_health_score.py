@@ -0,0 +1,53 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+import health_score
+
+
+def nutrients():
+    return pd.DataFrame({
+        'energy-kcal_value': [110.0, 250.0, 0.0, 380.0, 60.0],
+        'sugars_value': [1.5, 0.5, 12.0, 0.0, 4.7],
+        'fat_value': [3.0, 18.0, 0.2, 7.0, 3.6],
+        'saturated-fat_value': [1.0, 6.5, 0.1, 1.2, 2.3],
+        'proteins_value': [19.0, 30.0, 0.9, 10.0, 3.2],
+        'salt_value': [2.0, 4.5, 0.0, 0.6, 0.1],
+        'fiber_value': [0.5, 1.0, 2.0, 9.0, 0.0],
+    })
+
+
+# The original formula, row by row: zeros are missing values, each nutrient is divided by its maximum
+def legacy_score(df):
+    maxima = df.replace(0, np.nan).max()
+    scores = []
+    for _, row in df.iterrows():
+        value = {col: (math.nan if row[col] == 0 else row[col] / maxima[col]) for col in df.columns}
+        scores.append((value['proteins_value'] + value['fiber_value'])
+                      / (value['sugars_value'] + value['fat_value'] + value['saturated-fat_value'] + value['salt_value'] + 1))
+    return np.array(scores)
+
+
+def test_vectorized_score_matches_the_legacy_formula():
+    df = nutrients()
+    scores = health_score.health_scores(df)
+    np.testing.assert_allclose(scores, legacy_score(df), equal_nan=True)
+    # A missing (zero) nutrient gives no score; calories are not part of the default formula
+    assert np.isnan(scores[[2, 3, 4]]).all() and not np.isnan(scores[[0, 1]]).any()
+
+
+# Scoring a subset against the maxima of the whole dataset gives the same scores
+def test_subset_scored_with_saved_maxima_matches_full_scoring(tmp_path):
+    df = nutrients()
+    maxima = health_score.compute_maxima(df)
+    path = str(tmp_path / 'dataset.score.json')
+    health_score.save_score_parameters(path, maxima, {'sugars_value': 2.0})
+    full = health_score.health_scores(df, maxima, {'sugars_value': 2.0})
+    subset = health_score.rescore(df.iloc[:2], path)['health_score'].to_numpy()
+    np.testing.assert_allclose(subset, full[:2])
+    assert not np.allclose(full[:2], health_score.health_scores(df)[:2])
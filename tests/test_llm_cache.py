@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import llm_cache
+from llm_cache import ResponseCache
+
+
+# time.time() of llm_cache, advanced by hand
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(':memory:', ttl_seconds=60)
+    cache.set('key', 'answer')
+    clock[0] += 59
+    assert cache.get('key') == 'answer'
+    clock[0] += 2
+    assert cache.get('key') is None
+    assert cache.stats()['expired'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResponseCache(':memory:', max_entries=2)
+    for key in ['a', 'b']:
+        cache.set(key, key.upper())
+        clock[0] += 1
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('a') == 'A'
+    clock[0] += 1
+    cache.set('c', 'C')
+    assert [cache.get(key) for key in ['a', 'b', 'c']] == ['A', None, 'C']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_concurrent_identical_requests_call_the_api_once():
+    cache = ResponseCache(':memory:')
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    # Wait for the three other requests to be waiting on the first one
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and results == ['answer'] * 4
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 3
+    assert cache.get_or_compute('key', compute) == 'answer' and len(calls) == 1
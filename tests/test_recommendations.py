@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from recommendations import RecommendationEngine
+
+
+# Answers at once, except for the 'jam' prompts (slow) and the 'honey' prompts (error)
+class FakeLLM:
+    def complete(self, model, messages):
+        category = messages[-1]['content'].split("'")[1]
+        if category == 'jam':
+            time.sleep(1)
+        if category == 'honey':
+            raise ConnectionError('API unavailable')
+        return f"Best of {category} **Motivations:** low sugar"
+
+
+def test_a_slow_category_times_out_without_failing_the_others():
+    minima = {category: [0, 1, 2] for category in ['ham', 'jam', 'honey', 'milk']}
+    engine = RecommendationEngine(FakeLLM(), minima, lambda position: {'position': position}, timeout=0.3)
+    start = time.perf_counter()
+    text = engine.recommend(['ham', 'jam', 'honey', 'milk', 'unknown'], 'algo sano')
+
+    assert time.perf_counter() - start < 0.9
+    sections = [section for section in text.split('### ') if section]
+    assert [section.split('\n')[0] for section in sections] == [
+        'Healthiest Options - Ham', 'Healthiest Options - Jam', 'Healthiest Options - Honey', 'Healthiest Options - Milk']
+    assert 'Best of ham' in sections[0] and 'Best of milk' in sections[3]
+    assert 'the request timed out' in sections[1]
+    assert 'No recommendation: ConnectionError' in sections[2]
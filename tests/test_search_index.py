@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pre_processing'))
+
+from search_index import SearchIndex
+
+
+def test_trailing_stopword_is_ignored():
+    index = SearchIndex.from_frame(pd.DataFrame({'product_name_es': ['Leche de vaca', 'Yogur sin azúcar', 'Miel']}))
+    assert index.search('leche de ').tolist() == [0]
+    assert index.search('yogur sin ').tolist() == [1]
+    # Still being typed: a prefix ("de" -> nothing here, "a" -> azúcar)
+    assert index.search('yogur a').tolist() == [1]